@@ -20,3 +20,8 @@ class ProductNotFoundException(CartException):
     status_code = status.HTTP_404_NOT_FOUND
     default_detail = 'Product not found'
     default_code = 'product_not_found'
+
+class InvalidCartItemsException(CartException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Invalid cart items provided'
+    default_code = 'invalid_cart_items'
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cart.stores import CacheCartStore, get_cart_store
+
+
+class Command(BaseCommand):
+    help = 'Write carts changed in the cache store to the database (run periodically with write_behind durability)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Journal entries read per cache round-trip'
+        )
+
+    def handle(self, *args, **options):
+        store = get_cart_store()
+        if not isinstance(store, CacheCartStore):
+            raise CommandError("flush_carts needs CART_STORE = 'cache'")
+        flushed = store.flush_pending(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} carts'))
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.utils import timezone
 from users.models import Customer
 from products.models import Product
 from django.core.exceptions import ValidationError
@@ -14,16 +16,106 @@ class Cart(models.Model):
     class Meta:
         db_table = 'cart'
         
-    def validate_cart_items(self):
-        """Validate all items in cart for stock and limits"""
-        for item in self.cart_items.all():
-            product = Product.get_cached(item.product_id.id)
+    def validate_cart_items(self, lock=True):
+        """
+        Check every cart line in one sweep and return ``(quantities,
+        products)``: ``{product_id: quantity}`` in product ID order and the
+        products by ID. Lines and products are each read once; with ``lock``
+        (inside a transaction) the product rows are locked in ID order, so the
+        stock that was checked is the stock the order will decrement.
+
+        Raises a ValidationError carrying one error per violation, each with a
+        code and the offending ``product_id`` in its params.
+        """
+        quantities = dict(
+            self.cart_items.order_by('product_id').values_list('product_id', 'quantity')
+        )
+        products = Product.objects.filter(id__in=list(quantities)).order_by('id')
+        if lock:
+            products = products.select_for_update()
+        products = {product.id: product for product in products}
+
+        errors = []
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                errors.append(ValidationError(
+                    "Product %(product_id)s no longer exists",
+                    code='product_not_found', params={'product_id': product_id}
+                ))
+                continue
+            params = {
+                'product_id': product_id,
+                'name': product.name,
+                'requested': quantity,
+                'available': product.stock,
+                'limit': product.max_quantity_per_order
+            }
             if not product.is_active:
-                raise ValidationError(f"Product {product.name} is no longer available")
-            if item.quantity > product.stock:
-                raise ValidationError(f"Not enough stock for {product.name}")
-            if item.quantity > product.max_quantity_per_order:
-                raise ValidationError(f"Maximum quantity exceeded for {product.name}")
+                errors.append(ValidationError(
+                    "Product %(name)s is no longer available", code='product_unavailable', params=params
+                ))
+                continue
+            if quantity > product.stock:
+                errors.append(ValidationError(
+                    "Not enough stock for %(name)s. Available: %(available)s, Requested: %(requested)s",
+                    code='insufficient_stock', params=params
+                ))
+            if quantity > product.max_quantity_per_order:
+                errors.append(ValidationError(
+                    "Maximum quantity exceeded for %(name)s. Limit: %(limit)s, Requested: %(requested)s",
+                    code='max_quantity_exceeded', params=params
+                ))
+        if errors:
+            raise ValidationError(errors)
+        return quantities, products
+
+class CartItemQuerySet(models.QuerySet):
+    def upsert(self, cart_id, quantities, increment=True):
+        """
+        Add (increment=True) or set the quantities of {product_id: quantity}
+        in a cart with a single INSERT ... ON CONFLICT / ON DUPLICATE KEY
+        statement, so concurrent adds of the same product never lose updates.
+        """
+        if not quantities:
+            return
+        meta = self.model._meta
+        table = connection.ops.quote_name(meta.db_table)
+        cart_column = connection.ops.quote_name(meta.get_field('cart_id').column)
+        product_column = connection.ops.quote_name(meta.get_field('product_id').column)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        rows = [(cart_id, product_id, quantity, now, now) for product_id, quantity in quantities.items()]
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+        insert = (
+            f'INSERT INTO {table} ({cart_column}, {product_column}, quantity, created_at, updated_at) '
+            f'VALUES {placeholders} '
+        )
+        params = [value for row in rows for value in row]
+
+        if connection.vendor == 'mysql':
+            quantity = 'quantity + VALUES(quantity)' if increment else 'VALUES(quantity)'
+            sql = insert + f'ON DUPLICATE KEY UPDATE quantity = {quantity}, updated_at = VALUES(updated_at)'
+        elif connection.vendor in ('sqlite', 'postgresql'):
+            quantity = f'{table}.quantity + excluded.quantity' if increment else 'excluded.quantity'
+            sql = insert + (
+                f'ON CONFLICT ({cart_column}, {product_column}) '
+                f'DO UPDATE SET quantity = {quantity}, updated_at = excluded.updated_at'
+            )
+        else:
+            return self._upsert_fallback(cart_id, quantities, increment)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def _upsert_fallback(self, cart_id, quantities, increment):
+        with transaction.atomic():
+            for product_id, quantity in quantities.items():
+                updated = self.filter(cart_id=cart_id, product_id=product_id).update(
+                    quantity=F('quantity') + quantity if increment else quantity,
+                    updated_at=timezone.now()
+                )
+                if not updated:
+                    self.create(cart_id_id=cart_id, product_id_id=product_id, quantity=quantity)
+
 
 class CartItem(models.Model):
     quantity = models.IntegerField()
@@ -39,5 +131,11 @@ class CartItem(models.Model):
         on_delete=models.CASCADE,
         related_name="cart_items"
         )
+
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
-        db_table = 'cart_item'
\ No newline at end of file
+        db_table = 'cart_item'
+        constraints = [
+            models.UniqueConstraint(fields=['cart_id', 'product_id'], name='cart_item_unique_product'),
+        ]
@@ -1,3 +1,7 @@
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
 from rest_framework import serializers
 from .models import Cart, CartItem
 
@@ -23,7 +27,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         return value
 
 class CartSerializer(serializers.ModelSerializer):
-    cart_items = CartItemSerializer(many=True, read_only=True)
+    cart_items = serializers.SerializerMethodField()
     total_amount = serializers.SerializerMethodField()
     items_count = serializers.SerializerMethodField()
 
@@ -32,8 +36,98 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['id', 'cart_items', 'total_amount', 'items_count', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
+    @staticmethod
+    def get_items(obj):
+        # Carts built by the cache store carry their items, unsaved. Others
+        # are loaded once, with their products, for every field below.
+        items = getattr(obj, 'loaded_items', None)
+        if items is None:
+            items = obj.loaded_items = list(obj.cart_items.select_related('product_id'))
+        return items
+
+    def get_cart_items(self, obj):
+        return CartItemSerializer(self.get_items(obj), many=True).data
+
+    def get_total_amount(self, obj):
+        return sum(item.quantity * item.product_id.price for item in self.get_items(obj))
+
+    def get_items_count(self, obj):
+        return sum(item.quantity for item in self.get_items(obj))
+
+
+
+class CartProductSerializer(serializers.ModelSerializer):
+    """The few product fields a cart line needs"""
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'price', 'thumbnail']
+
+    def get_thumbnail(self, obj):
+        formats = (obj.image_variants or {}).get('thumbnail') or {}
+        path = formats.get('jpeg') or formats.get('webp')
+        if path:
+            return default_storage.url(path)
+        return obj.image.url if obj.image else None
+
+
+class CompactCartItemSerializer(serializers.ModelSerializer):
+    product = CartProductSerializer(source='product_id', read_only=True)
+    total_price = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product', 'quantity', 'total_price']
+
+    def get_total_price(self, obj):
+        return obj.quantity * obj.product_id.price
+
+
+class CompactCartSerializer(CartSerializer):
+    """
+    Cart with product stubs: the items and their products are read with one
+    query and the totals with one aggregate, whatever the cart size
+    """
+    product_columns = ['product_id__id', 'product_id__name', 'product_id__price', 'product_id__image', 'product_id__image_variants']
+
+    @classmethod
+    def get_items(cls, obj):
+        items = getattr(obj, 'loaded_items', None)
+        if items is None:
+            items = obj.loaded_items = list(
+                obj.cart_items.select_related('product_id').only('id', 'quantity', 'cart_id', *cls.product_columns)
+            )
+            obj.totals = cls.aggregate_totals(obj)
+        return items
+
+    @staticmethod
+    def aggregate_totals(obj):
+        line_total = ExpressionWrapper(
+            F('quantity') * F('product_id__price'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+        totals = obj.cart_items.aggregate(total_amount=Sum(line_total), items_count=Sum('quantity'))
+        return {
+            'total_amount': (totals['total_amount'] or Decimal('0')).quantize(Decimal('0.01')),
+            'items_count': totals['items_count'] or 0
+        }
+
+    def get_cart_items(self, obj):
+        return CompactCartItemSerializer(self.get_items(obj), many=True).data
+
+    def get_totals(self, obj):
+        self.get_items(obj)
+        if not hasattr(obj, 'totals'):
+            # Cached carts: their items are already in memory
+            obj.totals = {
+                'total_amount': sum((item.quantity * item.product_id.price for item in obj.loaded_items), Decimal('0')),
+                'items_count': sum(item.quantity for item in obj.loaded_items)
+            }
+        return obj.totals
+
     def get_total_amount(self, obj):
-        return sum(item.quantity * item.product_id.price for item in obj.cart_items.all())
+        return self.get_totals(obj)['total_amount']
 
     def get_items_count(self, obj):
-        return sum(item.quantity for item in obj.cart_items.all())
+        return self.get_totals(obj)['items_count']
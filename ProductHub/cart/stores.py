@@ -0,0 +1,337 @@
+# cart/stores.py
+"""
+Where live carts are kept.
+
+``CART_STORE = 'database'`` (the default) reads and writes the cart and
+cart_item tables on every interaction. ``CART_STORE = 'cache'`` keeps each
+customer's live cart in the shared cache and writes it to those tables
+later, according to ``CART_DURABILITY``:
+
+- ``write_through``: every change is also written to the database at once.
+  Reads are served from the cache.
+- ``write_behind`` (default): changed carts are journaled and written in
+  batches by the ``flush_carts`` command, and always at checkout. A cart
+  changed since the last flush is lost if its cache entry is evicted, and so
+  is a journal entry evicted before it is read (the cart is then written at
+  its next change or at checkout).
+- ``checkout``: carts are only written when an order is placed.
+
+Checkout always goes through ``checkout_cart``, which returns the flushed
+database cart, so ``Order.create_from_cart`` sees the same rows with
+either store. In cache mode cart items are addressed by their product ID,
+as they have no database ID before they are flushed.
+"""
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product
+from .exceptions import CartException, CartItemNotFoundException
+from .models import Cart, CartItem
+
+DURABILITY_MODES = ('write_through', 'write_behind', 'checkout')
+JOURNAL_SEQUENCE_KEY = 'cart:journal:seq'
+JOURNAL_FLUSHED_KEY = 'cart:journal:flushed'
+JOURNAL_GAP_KEY = 'cart:journal:gap'
+JOURNAL_LOCK_KEY = 'cart:journal:lock'
+# A journal entry still missing this long after its sequence number was
+# seen was evicted or never written (its worker died), and is skipped
+JOURNAL_GRACE = 60
+JOURNAL_LOCK_TIMEOUT = 600
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 2.0
+
+
+class DatabaseCartStore:
+    """Carts read from and written to the database on every interaction"""
+
+    def get_cart(self, customer):
+        cart, created = Cart.objects.get_or_create(customer_id=customer)
+        return cart
+
+    def add_item(self, customer, product, quantity):
+        return self.add_items(customer, {product.id: quantity})
+
+    def add_items(self, customer, quantities, increment=True):
+        """Add to (or, without increment, set) the quantities of {product_id: quantity}"""
+        cart = self.get_cart(customer)
+        CartItem.objects.upsert(cart.id, quantities, increment=increment)
+        return cart
+
+    def get_item_product_id(self, customer, item_id):
+        product_id = CartItem.objects.filter(
+            id=item_id,
+            cart_id__customer_id=customer
+        ).values_list('product_id', flat=True).first()
+        if product_id is None:
+            raise CartItemNotFoundException()
+        return product_id
+
+    def set_quantity(self, customer, item_id, quantity):
+        cart_item = CartItem.objects.filter(id=item_id, cart_id__customer_id=customer).first()
+        if not cart_item:
+            raise CartItemNotFoundException()
+        cart_item.quantity = quantity
+        cart_item.save()
+        return cart_item.cart_id
+
+    def remove_item(self, customer, item_id):
+        cart_item = CartItem.objects.filter(id=item_id, cart_id__customer_id=customer).first()
+        if not cart_item:
+            raise CartItemNotFoundException()
+        cart = cart_item.cart_id
+        cart_item.delete()
+        return cart
+
+    def clear(self, customer):
+        cart = Cart.objects.get(customer_id=customer)
+        cart.cart_items.all().delete()
+        return cart
+
+    def checkout_cart(self, customer):
+        """The customer's most recent database cart, raising Cart.DoesNotExist"""
+        return Cart.objects.filter(customer_id=customer).latest('created_at')
+
+
+class CacheCartStore(DatabaseCartStore):
+    """
+    Live carts kept in the cache as ``{'cart_id', 'created_at', 'updated_at',
+    'items': {product_id: [quantity, created_at, updated_at]}}``. The cart
+    row itself is created on first use, so the cart ID is stable.
+    """
+
+    def __init__(self, durability='write_behind', timeout=86400):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'CART_DURABILITY must be one of {", ".join(DURABILITY_MODES)}')
+        self.durability = durability
+        self.timeout = timeout
+
+    @staticmethod
+    def cache_key(customer_id):
+        return f'cart:{customer_id}'
+
+    @contextmanager
+    def locked(self, customer_id):
+        """Serialize changes to one customer's cart across workers"""
+        lock_key = f'{self.cache_key(customer_id)}:lock'
+        deadline = time.monotonic() + LOCK_WAIT
+        while not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise CartException('Your cart is being updated, please retry')
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            cache.delete(lock_key)
+
+    def load_state(self, customer):
+        state = cache.get(self.cache_key(customer.pk))
+        if state is None:
+            cart = DatabaseCartStore.get_cart(self, customer)
+            state = {
+                'cart_id': cart.id,
+                'created_at': cart.created_at,
+                'updated_at': cart.updated_at,
+                'items': {
+                    product_id: [quantity, created_at, updated_at]
+                    for product_id, quantity, created_at, updated_at in cart.cart_items.values_list(
+                        'product_id', 'quantity', 'created_at', 'updated_at'
+                    )
+                }
+            }
+            cache.set(self.cache_key(customer.pk), state, timeout=self.timeout)
+        return state
+
+    def save_state(self, customer, state):
+        state['updated_at'] = timezone.now()
+        cache.set(self.cache_key(customer.pk), state, timeout=self.timeout)
+        if self.durability == 'write_through':
+            self.write_state(state)
+        elif self.durability == 'write_behind':
+            self.journal(customer.pk)
+
+    def as_cart(self, customer, state):
+        """An unsaved Cart carrying its items, for CartSerializer"""
+        cart = Cart(
+            id=state['cart_id'],
+            customer_id=customer,
+            created_at=state['created_at'],
+            updated_at=state['updated_at']
+        )
+        products = Product.get_many_cached(list(state['items']))
+        cart.loaded_items = []
+        for product_id, (quantity, created_at, updated_at) in state['items'].items():
+            if product_id in products:
+                item = CartItem(
+                    id=product_id, cart_id=cart, quantity=quantity,
+                    created_at=created_at, updated_at=updated_at
+                )
+                item.product_id = products[product_id]
+                cart.loaded_items.append(item)
+        return cart
+
+    def get_cart(self, customer):
+        return self.as_cart(customer, self.load_state(customer))
+
+    def add_items(self, customer, quantities, increment=True):
+        with self.locked(customer.pk):
+            state = self.load_state(customer)
+            now = timezone.now()
+            for product_id, quantity in quantities.items():
+                item = state['items'].setdefault(product_id, [0, now, now])
+                item[0] = item[0] + quantity if increment else quantity
+                item[2] = now
+            self.save_state(customer, state)
+        return self.as_cart(customer, state)
+
+    def get_item_product_id(self, customer, item_id):
+        if item_id not in self.load_state(customer)['items']:
+            raise CartItemNotFoundException()
+        return item_id
+
+    def set_quantity(self, customer, item_id, quantity):
+        with self.locked(customer.pk):
+            state = self.load_state(customer)
+            item = state['items'].get(item_id)
+            if item is None:
+                raise CartItemNotFoundException()
+            item[0] = quantity
+            item[2] = timezone.now()
+            self.save_state(customer, state)
+        return self.as_cart(customer, state)
+
+    def remove_item(self, customer, item_id):
+        with self.locked(customer.pk):
+            state = self.load_state(customer)
+            if state['items'].pop(item_id, None) is None:
+                raise CartItemNotFoundException()
+            self.save_state(customer, state)
+        return self.as_cart(customer, state)
+
+    def clear(self, customer):
+        with self.locked(customer.pk):
+            state = self.load_state(customer)
+            state['items'] = {}
+            self.save_state(customer, state)
+        return self.as_cart(customer, state)
+
+    def checkout_cart(self, customer):
+        self.flush(customer.pk, forget=True)
+        return super().checkout_cart(customer)
+
+    def journal(self, customer_id):
+        """Record that a cart has changes the database has not seen yet"""
+        while True:
+            try:
+                sequence = cache.incr(JOURNAL_SEQUENCE_KEY)
+            except ValueError:
+                # Missing or evicted: restart from the flushed watermark, never below it
+                cache.add(JOURNAL_SEQUENCE_KEY, cache.get(JOURNAL_FLUSHED_KEY, 0), timeout=None)
+                continue
+            # add, not set: after a re-seed the number may still hold an unflushed entry
+            if cache.add(f'cart:journal:{sequence}', customer_id, timeout=None):
+                return sequence
+
+    def flush(self, customer_id, forget=False):
+        """Write one cached cart to the database; forget drops the cached copy"""
+        with self.locked(customer_id):
+            state = cache.get(self.cache_key(customer_id))
+            if state is not None:
+                self.write_state(state)
+            if forget:
+                cache.delete(self.cache_key(customer_id))
+        return state is not None
+
+    def flush_pending(self, batch_size=500):
+        """
+        Write every journaled cart, batch_size journal entries at a time.
+
+        The flushed watermark only moves over entries that were read, so an
+        entry whose sequence number was taken but which is not written yet is
+        picked up by a later run. Such a gap is skipped once it is older than
+        JOURNAL_GRACE. Runs are serialized; a run that finds another one
+        going returns 0 at once.
+        """
+        if not cache.add(JOURNAL_LOCK_KEY, 1, timeout=JOURNAL_LOCK_TIMEOUT):
+            return 0
+        try:
+            return self._flush_journal(batch_size)
+        finally:
+            cache.delete(JOURNAL_LOCK_KEY)
+
+    def _flush_journal(self, batch_size):
+        flushed = 0
+        last = cache.get(JOURNAL_FLUSHED_KEY, 0)
+        end = cache.get(JOURNAL_SEQUENCE_KEY, 0)
+        while last < end:
+            sequences = range(last + 1, min(last + batch_size, end) + 1)
+            entries = cache.get_many([f'cart:journal:{sequence}' for sequence in sequences])
+            done = last
+            for sequence in sequences:
+                if f'cart:journal:{sequence}' in entries:
+                    done = sequence
+                elif not self._gap_expired(sequence, end):
+                    break
+                else:
+                    done = sequence
+            if done == last:
+                break
+            read = [f'cart:journal:{sequence}' for sequence in range(last + 1, done + 1)]
+            for customer_id in {entries[key] for key in read if key in entries}:
+                flushed += self.flush(customer_id)
+            cache.delete_many(read)
+            cache.set(JOURNAL_FLUSHED_KEY, done, timeout=None)
+            last = done
+        return flushed
+
+    @staticmethod
+    def _gap_expired(sequence, end):
+        """Whether a missing entry has been missing for longer than JOURNAL_GRACE"""
+        gap = cache.get(JOURNAL_GAP_KEY)
+        now = time.time()
+        # A gap covers the missing numbers up to the sequence end seen with it;
+        # numbers handed out later get their own grace period
+        if gap is not None and gap['start'] <= sequence <= gap['end']:
+            return now - gap['seen_at'] > JOURNAL_GRACE
+        cache.set(JOURNAL_GAP_KEY, {'start': sequence, 'end': end, 'seen_at': now}, timeout=None)
+        return False
+
+    @staticmethod
+    @transaction.atomic
+    def write_state(state):
+        """Make the cart_item rows of a cart match its cached state"""
+        cart_id = state['cart_id']
+        # Products deleted since they were added cannot be written back
+        alive = set(Product.objects.filter(id__in=list(state['items'])).values_list('id', flat=True))
+        quantities = {
+            product_id: quantity
+            for product_id, (quantity, _, _) in state['items'].items()
+            if product_id in alive
+        }
+        CartItem.objects.filter(cart_id=cart_id).exclude(product_id__in=list(quantities)).delete()
+        CartItem.objects.upsert(cart_id, quantities, increment=False)
+        Cart.objects.filter(id=cart_id).update(updated_at=state['updated_at'])
+
+
+_stores = {}
+
+
+def get_cart_store():
+    mode = getattr(settings, 'CART_STORE', 'database')
+    durability = getattr(settings, 'CART_DURABILITY', 'write_behind')
+    key = (mode, durability)
+    if key not in _stores:
+        if mode == 'database':
+            _stores[key] = DatabaseCartStore()
+        elif mode == 'cache':
+            _stores[key] = CacheCartStore(
+                durability=durability,
+                timeout=getattr(settings, 'CART_CACHE_TIMEOUT', 86400)
+            )
+        else:
+            raise ValueError("CART_STORE must be 'database' or 'cache'")
+    return _stores[key]
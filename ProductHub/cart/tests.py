@@ -3,9 +3,18 @@ from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.db import IntegrityError
 from products.models import Product
 from .models import CartItem, Cart
+from . import stores
+from .stores import get_cart_store
 from users.models import Customer
+from orders.models import Order
+import io
+from unittest.mock import patch
 
 User = get_user_model()
 
@@ -81,3 +90,207 @@ class CartTests(APITestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(CartItem.objects.filter(cart_id=cart).count(), 0)
+
+
+    def test_add_same_item_twice(self):
+        """Test repeated adds increment one row instead of duplicating it"""
+        url = reverse('cart-items')
+        self.client.post(url, {'product_id': self.product.id, 'quantity': 1}, format='json')
+        response = self.client.post(url, {'product_id': self.product.id, 'quantity': 2}, format='json')
+        self.assertEqual(response.data['items_count'], 3)
+        self.assertEqual(list(CartItem.objects.values_list('product_id', 'quantity')), [(self.product.id, 3)])
+
+    def test_cart_item_unique_per_product(self):
+        """Test the database rejects a second row for the same product"""
+        cart = Cart.objects.create(customer_id=self.customer)
+        CartItem.objects.create(cart_id=cart, product_id=self.product, quantity=1)
+        with self.assertRaises(IntegrityError):
+            CartItem.objects.create(cart_id=cart, product_id=self.product, quantity=1)
+
+    def test_batch_add_and_set(self):
+        """Test the batch endpoint sums repeated adds and overwrites in set mode"""
+        url = reverse('cart-items-batch')
+        items = [
+            {'product_id': self.product.id, 'quantity': 1},
+            {'product_id': self.second_product.id, 'quantity': 2},
+            {'product_id': self.product.id, 'quantity': 1},
+        ]
+        response = self.client.post(url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items_count'], 4)
+
+        response = self.client.post(url, {'items': [{'product_id': self.product.id, 'quantity': 5}], 'mode': 'set'}, format='json')
+        quantities = dict(CartItem.objects.values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {self.product.id: 5, self.second_product.id: 2})
+
+    def test_batch_rejects_unknown_products(self):
+        """Test one unknown product fails the whole batch"""
+        url = reverse('cart-items-batch')
+        items = [{'product_id': self.product.id, 'quantity': 1}, {'product_id': 999999, 'quantity': 1}]
+        response = self.client.post(url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn('999999', response.data['error'])
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.client.post(url, {'items': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def fill_cart(self, size):
+        cart = Cart.objects.create(customer_id=self.customer)
+        for index in range(size):
+            product = Product.objects.create(name=f'Extra {index}', description='Test Product', price=2.5)
+            CartItem.objects.create(cart_id=cart, product_id=product, quantity=2)
+        return cart
+
+    def test_compact_cart(self):
+        """Test the compact view returns product stubs and SQL totals"""
+        self.fill_cart(3)
+        response = self.client.get(reverse('cart'), {'view': 'compact'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        item = response.data['cart_items'][0]
+        self.assertEqual(set(item), {'id', 'product', 'quantity', 'total_price'})
+        self.assertEqual(set(item['product']), {'id', 'name', 'price', 'thumbnail'})
+        self.assertEqual(str(response.data['total_amount']), '15.00')
+        self.assertEqual(response.data['items_count'], 6)
+
+    def test_cart_query_count_is_constant(self):
+        """Test cart reads cost the same number of queries for any cart size"""
+        cart = self.fill_cart(2)
+        url = reverse('cart')
+        # cart, items with their products, totals aggregate
+        with self.assertNumQueries(3):
+            self.client.get(url, {'view': 'compact'})
+        with self.assertNumQueries(2):
+            self.client.get(url)
+        for index in range(8):
+            product = Product.objects.create(name=f'More {index}', description='Test Product', price=1.0)
+            CartItem.objects.create(cart_id=cart, product_id=product, quantity=1)
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'view': 'compact'})
+        self.assertEqual(len(response.data['cart_items']), 10)
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+@override_settings(CART_STORE='cache', CART_DURABILITY='write_behind')
+class CacheCartStoreTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cacheduser', password='testpassword', is_customer=True)
+        self.customer = Customer.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(name='Product_0', description='Test Product', price=10.0, stock=10)
+        self.second_product = Product.objects.create(name='Product_1', description='Test Product', price=4.0, stock=10)
+
+    def add(self, product, quantity):
+        return self.client.post(reverse('cart-items'), {'product_id': product.id, 'quantity': quantity}, format='json')
+
+    def db_items(self):
+        return dict(CartItem.objects.filter(cart_id__customer_id=self.customer).values_list('product_id', 'quantity'))
+
+    def test_changes_stay_in_cache_until_flushed(self):
+        """Test write-behind carts reach the database only when flushed"""
+        self.add(self.product, 1)
+        response = self.add(self.product, 1)
+        self.add(self.second_product, 3)
+        self.assertEqual(response.data['cart_items'][0]['id'], self.product.id)
+        self.assertEqual(response.data['cart_items'][0]['quantity'], 2)
+        self.assertEqual(self.db_items(), {})
+
+        call_command('flush_carts', stdout=io.StringIO())
+        self.assertEqual(self.db_items(), {self.product.id: 2, self.second_product.id: 3})
+
+        # Items are addressed by product ID
+        self.client.put(reverse('cart-item-detail', args=[self.product.id]), {'quantity': 5}, format='json')
+        response = self.client.delete(reverse('cart-item-detail', args=[self.second_product.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_amount'], 50)
+        call_command('flush_carts', stdout=io.StringIO())
+        self.assertEqual(self.db_items(), {self.product.id: 5})
+
+    def test_checkout_flushes_the_cart(self):
+        """Test an order is created from the cached cart, which is then emptied"""
+        self.add(self.product, 2)
+        response = self.client.post(reverse('order-list-create'), {'currency': 'USD'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(customer_id=self.customer)
+        self.assertEqual(list(order.order_items.values_list('product_id', 'quantity')), [(self.product.id, 2)])
+        self.assertEqual(self.client.get(reverse('cart')).data['cart_items'], [])
+
+    def test_batch_add(self):
+        """Test batch adds are applied to the cached cart"""
+        self.add(self.product, 1)
+        items = [{'product_id': self.product.id, 'quantity': 2}, {'product_id': self.second_product.id, 'quantity': 1}]
+        response = self.client.post(reverse('cart-items-batch'), {'items': items}, format='json')
+        self.assertEqual(response.data['items_count'], 4)
+        self.assertEqual(self.db_items(), {})
+
+    @override_settings(CART_DURABILITY='write_through')
+    def test_write_through(self):
+        """Test write-through carts are written on every change"""
+        self.add(self.product, 2)
+        self.assertEqual(self.db_items(), {self.product.id: 2})
+        self.client.post(reverse('clear-cart'))
+        self.assertEqual(self.db_items(), {})
+
+    @override_settings(CART_DURABILITY='checkout')
+    def test_checkout_durability_skips_the_journal(self):
+        """Test checkout-only carts are not flushed in batches"""
+        self.add(self.product, 2)
+        out = io.StringIO()
+        call_command('flush_carts', stdout=out)
+        self.assertIn('Flushed 0 carts', out.getvalue())
+        self.assertEqual(self.db_items(), {})
+
+    def test_unknown_item(self):
+        """Test updating a product that is not in the cart is a 404"""
+        self.add(self.product, 1)
+        response = self.client.put(reverse('cart-item-detail', args=[self.second_product.id]), {'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_flush_waits_for_unwritten_journal_entries(self):
+        """Test a sequence number taken but not yet written holds the watermark back"""
+        store = get_cart_store()
+        self.add(self.product, 2)
+        # Another worker took the next number and has not written its entry yet
+        pending = cache.incr(stores.JOURNAL_SEQUENCE_KEY)
+        self.add(self.second_product, 1)
+
+        self.assertEqual(store.flush_pending(), 1)
+        self.assertEqual(cache.get(stores.JOURNAL_FLUSHED_KEY), pending - 1)
+
+        cache.set(f'cart:journal:{pending}', self.customer.pk, timeout=None)
+        self.assertEqual(store.flush_pending(), 1)
+        self.assertEqual(cache.get(stores.JOURNAL_FLUSHED_KEY), pending + 1)
+        self.assertEqual(self.db_items(), {self.product.id: 2, self.second_product.id: 1})
+
+    def test_flush_skips_expired_journal_gaps(self):
+        """Test an entry that never arrives is skipped after the grace period"""
+        store = get_cart_store()
+        # Sequence number 1 is taken, but its entry is never written
+        cache.set(stores.JOURNAL_SEQUENCE_KEY, 1, timeout=None)
+        self.add(self.product, 1)
+        store.flush_pending()
+        self.assertEqual(self.db_items(), {})
+        with patch.object(stores, 'JOURNAL_GRACE', -1):
+            store.flush_pending()
+        self.assertEqual(self.db_items(), {self.product.id: 1})
+
+    def test_journal_reseeds_above_the_watermark(self):
+        """Test an evicted sequence restarts from the flushed watermark"""
+        store = get_cart_store()
+        self.add(self.product, 1)
+        self.add(self.product, 1)
+        store.flush_pending()
+        cache.delete(stores.JOURNAL_SEQUENCE_KEY)
+        self.add(self.second_product, 3)
+        self.assertEqual(cache.get(stores.JOURNAL_SEQUENCE_KEY), 3)
+        store.flush_pending()
+        self.assertEqual(self.db_items(), {self.product.id: 2, self.second_product.id: 3})
+
+    def test_concurrent_flush_runs_are_serialized(self):
+        """Test a flush that finds another one running leaves the journal alone"""
+        self.add(self.product, 1)
+        cache.add(stores.JOURNAL_LOCK_KEY, 1)
+        self.assertEqual(get_cart_store().flush_pending(), 0)
+        cache.delete(stores.JOURNAL_LOCK_KEY)
+        self.assertEqual(get_cart_store().flush_pending(), 1)
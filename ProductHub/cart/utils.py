@@ -7,12 +7,15 @@ from rest_framework import status
 from .exceptions import (
     CartException,
     CartItemNotFoundException,
+    InvalidCartItemsException,
     InvalidQuantityException,
     ProductNotFoundException
 )
 
 from products.models import Product
 
+MAX_BATCH_ITEMS = 100
+
 def handle_cart_exceptions(func):
     """
     Enhanced decorator to handle all cart-related exceptions consistently
@@ -62,8 +65,7 @@ def validate_product(product_id):
         raise CartException('Product ID is required')
     
     try:
-        product = Product.objects.get(id=product_id)
-        return product
+        return Product.get_cached(product_id)
     except Product.DoesNotExist:
         raise ProductNotFoundException(f'Product with id {product_id} not found')
 
@@ -85,4 +87,33 @@ def validate_cart_item_quantity(quantity, raise_exception=True):
     except (ValueError, TypeError):
         if raise_exception:
             raise InvalidQuantityException('Quantity must be a valid number')
-        return False
\ No newline at end of file
+        return False
+
+
+def validate_cart_items_batch(items, increment=True):
+    """
+    Validate a list of {product_id, quantity} entries and return
+    {product_id: quantity}. Repeated products are summed when adding; the
+    last entry wins when setting. All products are checked with one lookup.
+    """
+    if not isinstance(items, list) or not items:
+        raise InvalidCartItemsException('items must be a non-empty list of {product_id, quantity}')
+    if len(items) > MAX_BATCH_ITEMS:
+        raise InvalidCartItemsException(f'At most {MAX_BATCH_ITEMS} items can be sent at once')
+
+    quantities = {}
+    for entry in items:
+        if not isinstance(entry, dict) or not entry.get('product_id'):
+            raise InvalidCartItemsException('Each item needs a product_id')
+        try:
+            product_id = int(entry['product_id'])
+        except (TypeError, ValueError):
+            raise InvalidCartItemsException(f"Invalid product_id: {entry['product_id']}")
+        quantity = validate_cart_item_quantity(entry.get('quantity', 1))
+        quantities[product_id] = quantities.get(product_id, 0) + quantity if increment else quantity
+
+    products = Product.get_many_cached(quantities)
+    missing = sorted(set(quantities) - set(products))
+    if missing:
+        raise ProductNotFoundException(f'Products not found: {missing}')
+    return quantities
@@ -2,30 +2,37 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
-from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
-from .exceptions import CartItemNotFoundException
-from .utils import handle_cart_exceptions, validate_cart_item_quantity, validate_product
+from .serializers import CartSerializer, CartItemSerializer, CompactCartSerializer
+from .stores import get_cart_store
+from .utils import handle_cart_exceptions, validate_cart_item_quantity, validate_cart_items_batch, validate_product
 from users.permissions import IsCustomer, IsAdmin
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 
+def cart_serializer_class(request):
+    """?view=compact returns product stubs and SQL-computed totals"""
+    if request.query_params.get('view') == 'compact':
+        return CompactCartSerializer
+    return CartSerializer
+
+
 class CartView(APIView):
     permission_classes = [IsAuthenticated, IsCustomer|IsAdmin]
 
     @swagger_auto_schema(
         operation_description="Get user's cart or create if doesn't exist",
         tags=['Cart'],
+        manual_parameters=[
+            openapi.Parameter('view', openapi.IN_QUERY, description="'compact' for product stubs per item", type=openapi.TYPE_STRING)
+        ],
         responses={200: CartSerializer}
     )
     @handle_cart_exceptions
     def get(self, request):
         """Get user's cart or create if doesn't exist"""
-        cart, created = Cart.objects.get_or_create(
-            customer_id=request.user.customer
-        )
-        serializer = CartSerializer(cart)
+        cart = get_cart_store().get_cart(request.user.customer)
+        serializer = cart_serializer_class(request)(cart)
         return Response(serializer.data)
 
 
@@ -52,27 +59,48 @@ class AddCartItemView(APIView):
         product = validate_product(product_id)
         
         quantity = validate_cart_item_quantity(request.data.get('quantity', 1))
-        
-        cart, created = Cart.objects.get_or_create(
-            customer_id=request.user.customer
+
+        cart = get_cart_store().add_item(request.user.customer, product, quantity)
+
+        serializer = cart_serializer_class(request)(cart)
+        return Response(serializer.data)
+
+class BatchCartItemsView(APIView):
+    permission_classes = [IsAuthenticated, IsCustomer | IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Add or set many cart items at once",
+        tags=['Cart'],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'items': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'product_id': openapi.Schema(type=openapi.TYPE_INTEGER, description='Product ID'),
+                            'quantity': openapi.Schema(type=openapi.TYPE_INTEGER, description='Quantity', default=1)
+                        }
+                    )
+                ),
+                'mode': openapi.Schema(type=openapi.TYPE_STRING, description="'add' to the current quantities (default) or 'set' them")
+            }
         )
+    )
+    @handle_cart_exceptions
+    @transaction.atomic
+    def post(self, request):
+        """Add or set many cart items at once"""
+        mode = request.data.get('mode', 'add')
+        if mode not in ('add', 'set'):
+            raise ValueError("mode must be 'add' or 'set'")
+        increment = mode == 'add'
+        quantities = validate_cart_items_batch(request.data.get('items'), increment=increment)
+
+        cart = get_cart_store().add_items(request.user.customer, quantities, increment=increment)
 
-        cart_item = CartItem.objects.filter(
-            cart_id=cart,
-            product_id=product.id
-        ).first()
-
-        if cart_item:
-            cart_item.quantity += quantity
-            cart_item.save()
-        else:
-            CartItem.objects.create(
-                cart_id=cart,
-                product_id=product,
-                quantity=quantity
-            )
-
-        serializer = CartSerializer(cart)
+        serializer = cart_serializer_class(request)(cart)
         return Response(serializer.data)
 
 class CartItemDetailView(APIView):
@@ -93,21 +121,13 @@ class CartItemDetailView(APIView):
     def put(self, request, item_id):
         """Update cart item quantity"""
         quantity = validate_cart_item_quantity(request.data.get('quantity'))
-        
-        cart_item = CartItem.objects.filter(
-            id=item_id,
-            cart_id__customer_id=request.user.customer
-        ).first()
-
-        if not cart_item:
-            raise CartItemNotFoundException()
 
-        validate_product(cart_item.product_id.id)
+        # Item IDs are cart_item IDs, or product IDs with the cache store
+        store = get_cart_store()
+        validate_product(store.get_item_product_id(request.user.customer, item_id))
+        cart = store.set_quantity(request.user.customer, item_id, quantity)
 
-        cart_item.quantity = quantity
-        cart_item.save()
-
-        serializer = CartSerializer(cart_item.cart_id)
+        serializer = cart_serializer_class(request)(cart)
         return Response(serializer.data)
 
     @swagger_auto_schema(
@@ -118,18 +138,9 @@ class CartItemDetailView(APIView):
     @transaction.atomic
     def delete(self, request, item_id):
         """Remove item from cart"""
-        cart_item = CartItem.objects.filter(
-            id=item_id,
-            cart_id__customer_id=request.user.customer
-        ).first()
-        
-        if not cart_item:
-            raise CartItemNotFoundException()
+        cart = get_cart_store().remove_item(request.user.customer, item_id)
 
-        cart = cart_item.cart_id
-        cart_item.delete()
-
-        serializer = CartSerializer(cart)
+        serializer = cart_serializer_class(request)(cart)
         return Response(serializer.data)
 
 
@@ -144,8 +155,7 @@ class ClearCartView(APIView):
     @transaction.atomic
     def post(self, request):
         """Clear all items from cart"""
-        cart = Cart.objects.get(customer_id=request.user.customer)
-        cart.cart_items.all().delete()
-        
-        serializer = CartSerializer(cart)
+        cart = get_cart_store().clear(request.user.customer)
+
+        serializer = cart_serializer_class(request)(cart)
         return Response(serializer.data)
\ No newline at end of file
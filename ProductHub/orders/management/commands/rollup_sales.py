@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from orders import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold new order status history into the daily sales rollups read by the reporting '
+        'API. Run it every few minutes; --rebuild recomputes the rollups from the whole history.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Empty the rollups and fold all history again')
+        parser.add_argument('--batch-size', type=int, default=5000, help='History rows folded per transaction')
+        parser.add_argument(
+            '--settle-seconds',
+            type=int,
+            default=None,
+            help='Leave history younger than this for the next run (default ORDER_ROLLUP_SETTLE_SECONDS)'
+        )
+
+    def handle(self, *args, **options):
+        fold = rollups.rebuild if options['rebuild'] else rollups.fold_pending
+        folded = fold(batch_size=options['batch_size'], settle_seconds=options['settle_seconds'])
+        self.stdout.write(self.style.SUCCESS(f'Folded {folded} status history rows into the sales rollups'))
@@ -0,0 +1,59 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Move every order in one status to another, e.g. the nightly processing -> delivered '
+        'run. Orders are read in ID batches and each batch is applied with Order.bulk_transition '
+        'in its own transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='from_status', required=True, help='Current status of the orders to move')
+        parser.add_argument('--to', dest='to_status', required=True, help='Status to move them to')
+        parser.add_argument('--before', help='Only orders placed before this ISO datetime')
+        parser.add_argument('--notes', default='', help='Note stored on each status history row')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders updated per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would move')
+
+    def handle(self, *args, **options):
+        statuses = dict(Order.STATUS_CHOICES)
+        from_status, to_status = options['from_status'], options['to_status']
+        if from_status not in statuses or to_status not in statuses:
+            raise CommandError(f'Statuses must be one of {", ".join(statuses)}')
+        if to_status not in Order.VALID_STATUS_TRANSITIONS[from_status]:
+            raise CommandError(f'Invalid status transition from {from_status} to {to_status}')
+
+        orders = Order.objects.filter(status=from_status)
+        if options['before']:
+            before = parse_datetime(options['before'])
+            if before is None:
+                raise CommandError('--before must be an ISO datetime')
+            # created_at, as order_date moves whenever an order is saved
+            orders = orders.filter(created_at__lt=before)
+
+        if options['dry_run']:
+            self.stdout.write(f'{orders.count()} orders would move from {from_status} to {to_status}')
+            return
+
+        moved = 0
+        last_id = 0
+        while True:
+            ids = list(
+                orders.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            try:
+                result = Order.bulk_transition(ids, to_status, notes=options['notes'])
+            except ValidationError as e:
+                raise CommandError(e.messages[0])
+            moved += len(result['updated'])
+            last_id = ids[-1]
+            self.stdout.write(f'Moved {moved} orders so far')
+
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} orders from {from_status} to {to_status}'))
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-17 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_reference_alter_order_status'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer_id', 'order_date', 'id'], name='order_customer_date_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_custome_8ef3e6_idx',
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.4 on 2026-10-17 20:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_customer_date_idx'),
+        ('products', '0014_related_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_history_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'rollup_watermark',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStatusSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('delivered', 'Delivered'), ('paid', 'Paid'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('currency', models.CharField(choices=[('USD', 'USD'), ('GHc', 'GHc'), ('EUR', 'EUR'), ('GBP', 'GBP')], max_length=3)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'db_table': 'daily_status_sales',
+                'constraints': [models.UniqueConstraint(fields=('day', 'status', 'currency'), name='daily_status_sales_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('currency', models.CharField(choices=[('USD', 'USD'), ('GHc', 'GHc'), ('EUR', 'EUR'), ('GBP', 'GBP')], max_length=3)),
+                ('units_ordered', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units_cancelled', models.PositiveIntegerField(default=0)),
+                ('revenue_cancelled', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+            ],
+            options={
+                'db_table': 'daily_product_sales',
+                'indexes': [models.Index(fields=['currency', 'day'], name='daily_product_sales_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'product_id', 'currency'), name='daily_product_sales_unique')],
+            },
+        ),
+    ]
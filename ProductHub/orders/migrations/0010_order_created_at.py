@@ -0,0 +1,43 @@
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+
+def backfill_created_at(apps, schema_editor):
+    """Existing orders were created when their first status was recorded"""
+    Order = apps.get_model('orders', 'Order')
+    OrderStatusHistory = apps.get_model('orders', 'OrderStatusHistory')
+    first_status = (
+        OrderStatusHistory.objects.filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(first=Min('timestamp'))
+        .values('first')
+    )
+    Order.objects.update(created_at=Coalesce(Subquery(first_status), 'order_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer_id', 'created_at', 'id'], name='order_customer_created_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_customer_date_idx',
+        ),
+    ]
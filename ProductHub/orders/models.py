@@ -3,7 +3,7 @@ from django.core.exceptions import ValidationError
 from products.models import Product
 from users.models import Customer
 from decimal import Decimal
-from django.db.models import F
+from django.db.models import Case, Count, F, Q, When
 from django.utils import timezone
 from django.db import transaction
 
@@ -46,6 +46,8 @@ class Order(models.Model):
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     order_date = models.DateTimeField(auto_now=True)
+    # Set once; order_date is auto_now and moves with every save
+    created_at = models.DateTimeField(auto_now_add=True)
     total = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='USD')
     reference = models.CharField(max_length=50, blank=True)
@@ -62,12 +64,23 @@ class Order(models.Model):
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['order_date']),
-            models.Index(fields=['customer_id']),
+            # Serves a customer's newest-first order history
+            models.Index(fields=['customer_id', 'created_at', 'id'], name='order_customer_created_idx'),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so save() can detect a change without a query
+        if 'status' in field_names:
+            instance._loaded_status = instance.status
+        return instance
+
     def save(self, *args, **kwargs):
         if not self._state.adding:  # If updating existing order
-            old_status = Order.objects.get(pk=self.pk).status
+            old_status = getattr(self, '_loaded_status', None)
+            if old_status is None:
+                old_status = Order.objects.filter(pk=self.pk).values_list('status', flat=True).get()
             if old_status != self.status:
                 self._validate_status_transition(old_status, self.status)
                 # Record status change
@@ -77,23 +90,100 @@ class Order(models.Model):
                     notes=f"Status changed from {old_status} to {self.status}"
                 )
         super().save(*args, **kwargs)
+        self._loaded_status = self.status
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or 'status' in fields:
+            self._loaded_status = self.status
 
     def _validate_status_transition(self, old_status, new_status):
         """Validate if the status transition is allowed"""
         if new_status not in self.VALID_STATUS_TRANSITIONS[old_status]:
             raise ValidationError(f"Invalid status transition from {old_status} to {new_status}")
 
+    @classmethod
+    def status_summary(cls, customer):
+        """{status: number of the customer's orders}, every status included, from one GROUP BY"""
+        summary = dict.fromkeys(dict(cls.STATUS_CHOICES), 0)
+        counts = (
+            cls.objects.filter(customer_id=customer)
+            .order_by()
+            .values_list('status')
+            .annotate(count=Count('id'))
+        )
+        summary.update(counts)
+        return summary
+
+    @classmethod
+    def bulk_transition(cls, order_ids, new_status, notes=''):
+        """
+        Move many orders to new_status at once. Transitions are checked
+        against VALID_STATUS_TRANSITIONS in memory, allowed ones are applied
+        with one UPDATE per source status and their history rows written with
+        one bulk_create. Orders already in new_status are left alone.
+
+        Returns ``{'updated': [ids], 'unchanged': [ids], 'rejected': {id: error},
+        'not_found': [ids]}``.
+        """
+        if new_status not in dict(cls.STATUS_CHOICES):
+            raise ValidationError(f"Invalid status {new_status}")
+        order_ids = set(order_ids)
+        result = {'updated': [], 'unchanged': [], 'rejected': {}, 'not_found': []}
+
+        with transaction.atomic():
+            current = dict(
+                cls.objects.select_for_update().filter(id__in=list(order_ids))
+                .order_by('id').values_list('id', 'status')
+            )
+            result['not_found'] = sorted(order_ids - set(current))
+
+            by_status = {}
+            for order_id, old_status in current.items():
+                if old_status == new_status:
+                    result['unchanged'].append(order_id)
+                elif new_status in cls.VALID_STATUS_TRANSITIONS[old_status]:
+                    by_status.setdefault(old_status, []).append(order_id)
+                else:
+                    result['rejected'][order_id] = f"Invalid status transition from {old_status} to {new_status}"
+
+            history = []
+            for old_status, ids in by_status.items():
+                cls.objects.filter(id__in=ids, status=old_status).update(status=new_status)
+                history.extend(
+                    OrderStatusHistory(
+                        order_id=order_id,
+                        status=new_status,
+                        notes=notes or f"Status changed from {old_status} to {new_status}"
+                    )
+                    for order_id in ids
+                )
+                result['updated'].extend(ids)
+            OrderStatusHistory.objects.bulk_create(history, batch_size=1000)
+
+        result['updated'].sort()
+        return result
+
     @classmethod
     def create_from_cart(cls, cart, currency='USD'):
-        """Create an order from a cart with automatic total calculation"""
+        """
+        Create an order from a cart with automatic total calculation.
+
+        ``Cart.validate_cart_items`` locks the cart's products in ID order, so
+        concurrent checkouts of overlapping carts cannot deadlock, and their
+        stock is decremented by one guarded UPDATE: if it matches fewer rows
+        than there are cart lines some product ran out and the whole order is
+        rolled back.
+        """
         with transaction.atomic():
-            # Validate cart items
-            cart.validate_cart_items()
+            # Validate cart items against the locked rows
+            quantities, products = cart.validate_cart_items(lock=True)
 
             # Calculate total from cart items
-            total = Decimal('0')
-            for item in cart.cart_items.select_related('product_id').all():
-                total += item.quantity * item.product_id.price
+            total = sum(
+                (quantity * products[product_id].price for product_id, quantity in quantities.items()),
+                Decimal('0')
+            )
 
             # Store original total before any discounts
             original_total = total
@@ -111,18 +201,28 @@ class Order(models.Model):
                 currency=currency
             )
 
-            # Create order items and update stock
-            for cart_item in cart.cart_items.select_related('product_id').all():
-                OrderItem.objects.create(
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order_id=order,
-                    product_id=cart_item.product_id,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product_id.price
+                    product_id=products[product_id],
+                    quantity=quantity,
+                    price=products[product_id].price
                 )
-                # Update stock
-                Product.objects.filter(id=cart_item.product_id.id).update(
-                    stock=F('stock') - cart_item.quantity
+                for product_id, quantity in quantities.items()
+            ])
+
+            # Update stock: one statement, each line guarded by stock >= quantity
+            in_stock = Q()
+            for product_id, quantity in quantities.items():
+                in_stock |= Q(id=product_id, stock__gte=quantity)
+            updated = Product.objects.for_ids(list(quantities)).filter(in_stock).update(
+                stock=Case(
+                    *[When(id=product_id, then=F('stock') - quantity) for product_id, quantity in quantities.items()],
+                    output_field=models.PositiveIntegerField()
                 )
+            )
+            if updated != len(quantities):
+                raise ValidationError("Some products in your cart are no longer in stock", code='insufficient_stock')
 
             # Record initial status
             OrderStatusHistory.objects.create(
@@ -162,4 +262,52 @@ class OrderItem(models.Model):
     @property
     def subtotal(self):
         """Calculate subtotal for the order item"""
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price
+
+class DailyStatusSales(models.Model):
+    """Orders that entered a status on a day, per currency; maintained by orders.rollups"""
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    currency = models.CharField(max_length=3, choices=Order.CURRENCY_CHOICES)
+    orders = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'daily_status_sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status', 'currency'], name='daily_status_sales_unique')
+        ]
+
+
+class DailyProductSales(models.Model):
+    """Units and revenue per product, day and currency; maintained by orders.rollups"""
+    day = models.DateField()
+    product_id = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="daily_sales"
+    )
+    currency = models.CharField(max_length=3, choices=Order.CURRENCY_CHOICES)
+    units_ordered = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units_cancelled = models.PositiveIntegerField(default=0)
+    revenue_cancelled = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'daily_product_sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product_id', 'currency'], name='daily_product_sales_unique')
+        ]
+        indexes = [
+            models.Index(fields=['currency', 'day'], name='daily_product_sales_day_idx'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """The last OrderStatusHistory row folded into the sales rollups"""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_history_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'rollup_watermark'
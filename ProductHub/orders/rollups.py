@@ -0,0 +1,203 @@
+# orders/rollups.py
+"""
+Daily sales rollups for reporting.
+
+Reports never aggregate the order tables; they read two small tables kept up
+to date from the OrderStatusHistory log, which every order creation and
+status change appends to:
+
+- ``DailyStatusSales``: for each day, status and currency, the orders that
+  entered that status and their total amount.
+- ``DailyProductSales``: for each day, product and currency, the units and
+  revenue ordered (from the creation, i.e. ``pending``, event) and cancelled.
+
+``fold_pending`` folds history rows past the ``RollupWatermark`` into the
+rollups in ID batches, each in one transaction with the watermark row locked,
+so concurrent runs cannot count a row twice. Rows younger than
+``ORDER_ROLLUP_SETTLE_SECONDS`` are left for the next run: a lower history ID
+can still be uncommitted while a higher one is visible, and folding past it
+would skip it for good. ``rebuild`` empties the rollups and folds the whole
+log again.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import takewhile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import DailyProductSales, DailyStatusSales, Order, OrderItem, OrderStatusHistory, RollupWatermark
+
+logger = logging.getLogger(__name__)
+
+SALES_WATERMARK = 'sales'
+
+
+def get_settle_seconds():
+    return getattr(settings, 'ORDER_ROLLUP_SETTLE_SECONDS', 60)
+
+
+def fold_batch(batch_size, settle_seconds):
+    """Fold up to batch_size settled history rows; returns (folded, more_pending)"""
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=SALES_WATERMARK)
+        events = list(
+            OrderStatusHistory.objects
+            .filter(id__gt=watermark.last_history_id)
+            .order_by('id')
+            .values_list('id', 'order_id', 'status', 'timestamp')[:batch_size]
+        )
+        cutoff = timezone.now() - timedelta(seconds=settle_seconds)
+        settled = list(takewhile(lambda event: event[3] < cutoff, events))
+        if not settled:
+            return 0, False
+
+        status_deltas, product_deltas = collect_deltas(settled)
+        apply_deltas(DailyStatusSales, ('day', 'status', 'currency'), ('orders', 'amount'), status_deltas)
+        apply_deltas(
+            DailyProductSales,
+            ('day', 'product_id_id', 'currency'),
+            ('units_ordered', 'revenue', 'units_cancelled', 'revenue_cancelled'),
+            product_deltas
+        )
+        watermark.last_history_id = settled[-1][0]
+        watermark.save()
+    return len(settled), len(settled) == batch_size
+
+
+def collect_deltas(events):
+    """
+    Per-key increments for both rollups from (id, order_id, status, timestamp)
+    events. Amounts come from the order's current total, currency and lines,
+    not from their values when the event happened. Events of orders deleted
+    since, which only a delete racing the fold can leave behind as history
+    cascades with its order, are skipped and logged; deleting an order never
+    takes back what was already folded.
+    """
+    orders = {
+        order_id: (currency, total)
+        for order_id, currency, total in Order.objects.filter(
+            id__in={event[1] for event in events}
+        ).values_list('id', 'currency', 'total')
+    }
+
+    status_deltas = defaultdict(lambda: [0, Decimal('0')])
+    line_events = []
+    skipped = []
+    for history_id, order_id, order_status, timestamp in events:
+        if order_id not in orders:
+            skipped.append(history_id)
+            continue
+        currency, total = orders[order_id]
+        day = timezone.localdate(timestamp)
+        delta = status_deltas[day, order_status, currency]
+        delta[0] += 1
+        delta[1] += total
+        if order_status in ('pending', 'cancelled'):
+            line_events.append((order_id, day, order_status, currency))
+    if skipped:
+        logger.warning(
+            'Skipped %d status history rows of deleted orders, e.g. history IDs %s',
+            len(skipped), skipped[:10]
+        )
+
+    lines = defaultdict(list)
+    items = OrderItem.objects.filter(
+        order_id__in={event[0] for event in line_events}
+    ).values_list('order_id', 'product_id', 'quantity', 'price')
+    for order_id, product_id, quantity, price in items:
+        lines[order_id].append((product_id, quantity, quantity * price))
+
+    product_deltas = defaultdict(lambda: [0, Decimal('0'), 0, Decimal('0')])
+    for order_id, day, order_status, currency in line_events:
+        offset = 0 if order_status == 'pending' else 2
+        for product_id, quantity, revenue in lines[order_id]:
+            delta = product_deltas[day, product_id, currency]
+            delta[offset] += quantity
+            delta[offset + 1] += revenue
+    return status_deltas, product_deltas
+
+
+def apply_deltas(model, key_fields, value_fields, deltas):
+    """Add deltas {key: [values]} to the rollup rows, creating the missing ones"""
+    if not deltas:
+        return
+    # A superset of the touched rows, narrowed by the key lookup below
+    candidates = model.objects.filter(**{
+        f'{field}__in': {key[index] for key in deltas}
+        for index, field in enumerate(key_fields)
+    })
+    existing = {tuple(getattr(row, field) for field in key_fields): row for row in candidates}
+
+    to_update, to_create = [], []
+    for key, values in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            to_create.append(model(**dict(zip(key_fields, key)), **dict(zip(value_fields, values))))
+            continue
+        for field, value in zip(value_fields, values):
+            setattr(row, field, getattr(row, field) + value)
+        to_update.append(row)
+    model.objects.bulk_update(to_update, value_fields, batch_size=500)
+    model.objects.bulk_create(to_create, batch_size=500)
+
+
+def fold_pending(batch_size=5000, settle_seconds=None):
+    """Fold every settled history row past the watermark; returns how many were folded"""
+    if settle_seconds is None:
+        settle_seconds = get_settle_seconds()
+    folded = 0
+    more = True
+    while more:
+        count, more = fold_batch(batch_size, settle_seconds)
+        folded += count
+    return folded
+
+
+def rebuild(batch_size=5000, settle_seconds=None):
+    """Empty the rollups and fold the whole status history again"""
+    with transaction.atomic():
+        RollupWatermark.objects.update_or_create(name=SALES_WATERMARK, defaults={'last_history_id': 0})
+        DailyStatusSales.objects.all().delete()
+        DailyProductSales.objects.all().delete()
+    return fold_pending(batch_size=batch_size, settle_seconds=settle_seconds)
+
+
+def last_folded_at():
+    """When the rollups were last brought up to date, or None if never"""
+    return RollupWatermark.objects.filter(name=SALES_WATERMARK).values_list('updated_at', flat=True).first()
+
+
+def status_report(start, end, currency=None):
+    """Daily rows and per status totals of DailyStatusSales between start and end, inclusive"""
+    rows = DailyStatusSales.objects.filter(day__range=(start, end))
+    if currency:
+        rows = rows.filter(currency=currency)
+    daily = list(rows.order_by('day', 'status', 'currency').values('day', 'status', 'currency', 'orders', 'amount'))
+    totals = list(
+        rows.order_by('status', 'currency')
+        .values('status', 'currency')
+        .annotate(order_count=Sum('orders'), total_amount=Sum('amount'))
+    )
+    return {'totals': totals, 'daily': daily}
+
+
+def product_report(start, end, currency, limit):
+    """Best selling products by net revenue between start and end, inclusive"""
+    return list(
+        DailyProductSales.objects
+        .filter(currency=currency, day__range=(start, end))
+        .values('product_id')
+        .annotate(
+            ordered_units=Sum('units_ordered'),
+            cancelled_units=Sum('units_cancelled'),
+            gross_revenue=Sum('revenue'),
+            cancelled_revenue=Sum('revenue_cancelled')
+        )
+        .annotate(net_revenue=F('gross_revenue') - F('cancelled_revenue'))
+        .order_by('-net_revenue', 'product_id')[:limit]
+    )
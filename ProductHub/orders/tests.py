@@ -1,11 +1,21 @@
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from .models import Order, OrderItem
+from .models import DailyProductSales, DailyStatusSales, Order, OrderItem, OrderStatusHistory
+from . import rollups
 from products.models import Product, Category
 from users.models import Customer, Admin
 from django.contrib.auth import get_user_model
 from cart.models import Cart, CartItem
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.utils import timezone
+from io import StringIO
 
 User = get_user_model()
 
@@ -75,6 +85,22 @@ class OrderTests(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_create_order_reports_every_violation(self):
+        """Test all invalid cart lines are reported together"""
+        self.client.force_authenticate(user=self.user1)
+        cart = Cart.objects.create(customer_id=self.user1.customer)
+        inactive = Product.objects.create(name='Retired', description='Test Product', price=5.0, stock=10, is_active=False)
+        CartItem.objects.create(cart_id=cart, product_id=self.product, quantity=3)
+        CartItem.objects.create(cart_id=cart, product_id=inactive, quantity=1)
+        response = self.client.post(reverse('order-list-create'), {'currency': 'USD'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        violations = {(item['product_id'], item['code']) for item in response.data['violations']}
+        self.assertEqual(violations, {
+            (self.product.id, 'max_quantity_exceeded'),
+            (inactive.id, 'product_unavailable')
+        })
+        self.assertEqual(cart.cart_items.count(), 2)
+
 
     def test_get_all_orders(self):
         self.client.force_authenticate(user=self.user1)
@@ -84,6 +110,43 @@ class OrderTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('items', response.data)
         self.assertGreater(len(response.data['items']), 0)
+
+    def test_get_orders_with_cursor(self):
+        """Test cursor paging through orders newest first"""
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('order-list-create')
+        response = self.client.get(url, {'pagination': 'cursor', 'page_size': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items'][0]['id'], self.order2.id)
+        response = self.client.get(response.data['links']['next'])
+        self.assertEqual(response.data['items'][0]['id'], self.order1.id)
+        self.assertIsNone(response.data['links']['next'])
+
+    def test_order_history_constant_queries(self):
+        """Test a history page costs the same however many orders and items there are"""
+        self.client.force_authenticate(user=self.user1)
+        for order in (self.order1, self.order2):
+            for quantity in (1, 2, 3):
+                OrderItem.objects.create(quantity=quantity, price=10.0, order_id=order, product_id=self.product)
+        url = reverse('order-list-create')
+        # page, prefetched items, status summary
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'page_size': 10, 'summary': 'true'})
+        self.assertEqual([order['id'] for order in response.data['items']], [self.order2.id, self.order1.id])
+        self.assertEqual(len(response.data['items'][0]['order_items']), 3)
+        self.assertNotIn('total_items', response.data)
+        self.assertEqual(response.data['status_summary']['pending'], 1)
+        self.assertEqual(response.data['status_summary']['processing'], 1)
+        self.assertEqual(response.data['status_summary']['delivered'], 0)
+
+    def test_order_history_ignores_updates(self):
+        """Test updating an order does not move it within the history"""
+        self.client.force_authenticate(user=self.user1)
+        self.order1.status = 'processing'
+        self.order1.save()
+        Order.bulk_transition([self.order2.id], 'delivered')
+        response = self.client.get(reverse('order-list-create'), {'page_size': 10})
+        self.assertEqual([order['id'] for order in response.data['items']], [self.order2.id, self.order1.id])
     
 
 
@@ -121,3 +184,197 @@ class OrderTests(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreater(len(response.data), 0)
+
+
+class OrderCreationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='checkout', password='testpassword', is_customer=True)
+        self.customer = Customer.objects.create(user=self.user)
+        self.cart = Cart.objects.create(customer_id=self.customer)
+        self.products = [
+            Product.objects.create(name=f'Line {index}', description='Test Product', price=2.0, stock=5)
+            for index in range(50)
+        ]
+        for product in self.products:
+            CartItem.objects.create(cart_id=self.cart, product_id=product, quantity=2)
+
+    def test_large_cart_checks_out_in_constant_queries(self):
+        """Test a 50-line cart is ordered with set-based statements"""
+        with self.assertNumQueries(9):
+            order = Order.create_from_cart(self.cart)
+        self.assertEqual(order.total, Decimal('200.00'))
+        self.assertEqual(order.order_items.count(), 50)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {3})
+        self.assertFalse(self.cart.cart_items.exists())
+
+    def test_insufficient_stock_is_rejected(self):
+        """Test validation against the locked rows rejects the order"""
+        Product.objects.filter(id=self.products[10].id).update(stock=1)
+        with self.assertRaises(ValidationError):
+            Order.create_from_cart(self.cart)
+        self.assertFalse(Order.objects.filter(customer_id=self.customer).exists())
+        self.assertEqual(self.cart.cart_items.count(), 50)
+
+    def test_guarded_decrement_prevents_overselling(self):
+        """Test stock sold by a concurrent checkout rolls the whole order back"""
+        bulk_create = OrderItem.objects.bulk_create
+
+        def concurrent_sale(*args, **kwargs):
+            # Another checkout takes the stock after this one validated
+            Product.objects.filter(id=self.products[-1].id).update(stock=1)
+            return bulk_create(*args, **kwargs)
+
+        with patch.object(OrderItem.objects, 'bulk_create', side_effect=concurrent_sale):
+            with self.assertRaises(ValidationError):
+                Order.create_from_cart(self.cart)
+        self.assertFalse(Order.objects.filter(customer_id=self.customer).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__customer_id=self.customer).exists())
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 5)
+
+
+class OrderStatusTransitionTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user(username='fulfilment', password='testpassword', is_admin=True)
+        Admin.objects.create(user=self.admin_user)
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(username='buyer', password='testpassword', is_customer=True)
+        )
+        self.processing = [self.create_order('processing') for _ in range(3)]
+        self.pending = self.create_order('pending')
+        self.delivered = self.create_order('delivered')
+
+    def create_order(self, order_status):
+        return Order.objects.create(
+            customer_id=self.customer, total=10.0, original_total=10.0, status=order_status
+        )
+
+    def test_save_uses_loaded_status(self):
+        """Test a status change on a loaded order issues no extra SELECT"""
+        order = Order.objects.get(id=self.pending.id)
+        order.status = 'processing'
+        with self.assertNumQueries(4):  # savepoint, history insert, update, release
+            with transaction.atomic():
+                order.save()
+        self.assertEqual(order.status_history.get().notes, 'Status changed from pending to processing')
+        order.status = 'pending'
+        with self.assertRaises(ValidationError):
+            order.save()
+
+    def test_bulk_transition(self):
+        """Test allowed transitions are applied and the rest reported"""
+        ids = [order.id for order in self.processing] + [self.pending.id, self.delivered.id, 999999]
+        with self.assertNumQueries(5):  # savepoint, lock, update, history insert, release
+            result = Order.bulk_transition(ids, 'delivered')
+        # Moving orders does not change when they were placed
+        self.assertEqual(Order.objects.get(id=self.processing[0].id).order_date, self.processing[0].order_date)
+        self.assertEqual(result['updated'], [order.id for order in self.processing])
+        self.assertEqual(result['unchanged'], [self.delivered.id])
+        self.assertIn(self.pending.id, result['rejected'])
+        self.assertEqual(result['not_found'], [999999])
+        self.assertEqual(Order.objects.filter(status='delivered').count(), 4)
+        self.assertEqual(OrderStatusHistory.objects.filter(status='delivered').count(), 3)
+
+    def test_bulk_status_endpoint(self):
+        """Test admins can move many orders through the API"""
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse('order-bulk-status')
+        ids = [order.id for order in self.processing]
+        response = self.client.post(url, {'order_ids': ids, 'status': 'delivered'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], ids)
+        response = self.client.post(url, {'order_ids': ids, 'status': 'shipped'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {'order_ids': 'all', 'status': 'delivered'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_transition_orders_command(self):
+        """Test the command moves every matching order in batches"""
+        call_command('transition_orders', '--from', 'processing', '--to', 'delivered', '--batch-size', '2', stdout=StringIO())
+        self.assertFalse(Order.objects.filter(status='processing').exists())
+        self.assertEqual(OrderStatusHistory.objects.filter(status='delivered').count(), 3)
+        with self.assertRaises(CommandError):
+            call_command('transition_orders', '--from', 'delivered', '--to', 'pending', stdout=StringIO())
+
+    def test_transition_orders_before(self):
+        """Test --before selects orders by when they were placed"""
+        old = self.processing[0]
+        Order.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=2))
+        cutoff = (timezone.now() - timedelta(days=1)).isoformat()
+        call_command(
+            'transition_orders', '--from', 'processing', '--to', 'delivered', '--before', cutoff,
+            stdout=StringIO()
+        )
+        moved = Order.objects.filter(id__in=[order.id for order in self.processing], status='delivered')
+        self.assertEqual(list(moved.values_list('id', flat=True)), [old.id])
+
+
+class SalesRollupTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user(username='analyst', password='testpassword', is_admin=True)
+        Admin.objects.create(user=self.admin_user)
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(username='shopper', password='testpassword', is_customer=True)
+        )
+        self.lamp = Product.objects.create(name='Lamp', description='Test Product', price=20.0, stock=50)
+        self.desk = Product.objects.create(name='Desk', description='Test Product', price=100.0, stock=50)
+        self.first = self.checkout({self.lamp: 2, self.desk: 1})
+        self.second = self.checkout({self.lamp: 1})
+
+    def checkout(self, quantities):
+        cart = Cart.objects.create(customer_id=self.customer)
+        for product, quantity in quantities.items():
+            CartItem.objects.create(cart_id=cart, product_id=product, quantity=quantity)
+        return Order.create_from_cart(cart)
+
+    def test_fold_is_incremental(self):
+        """Test new history is folded once and past the watermark only"""
+        self.assertEqual(rollups.fold_pending(settle_seconds=0), 2)
+        self.assertEqual(rollups.fold_pending(settle_seconds=0), 0)
+        Order.bulk_transition([self.second.id], 'cancelled')
+        self.assertEqual(rollups.fold_pending(batch_size=1, settle_seconds=0), 1)
+
+        today = timezone.localdate()
+        pending = DailyStatusSales.objects.get(day=today, status='pending', currency='USD')
+        self.assertEqual((pending.orders, pending.amount), (2, Decimal('160.00')))
+        self.assertEqual(DailyStatusSales.objects.get(status='cancelled').amount, Decimal('20.00'))
+        lamp = DailyProductSales.objects.get(day=today, product_id=self.lamp)
+        self.assertEqual((lamp.units_ordered, lamp.units_cancelled), (3, 1))
+        self.assertEqual((lamp.revenue, lamp.revenue_cancelled), (Decimal('60.00'), Decimal('20.00')))
+
+    def test_history_of_deleted_orders_is_logged(self):
+        """Test events whose order no longer exists are skipped with a warning"""
+        event = (999999, 999999, 'pending', timezone.now())
+        with self.assertLogs('orders.rollups', 'WARNING') as logs:
+            status_deltas, product_deltas = rollups.collect_deltas([event])
+        self.assertEqual((dict(status_deltas), dict(product_deltas)), ({}, {}))
+        self.assertIn('999999', logs.output[0])
+
+    def test_unsettled_history_waits(self):
+        """Test history younger than the settle window is left for the next run"""
+        self.assertEqual(rollups.fold_pending(settle_seconds=3600), 0)
+        self.assertFalse(DailyStatusSales.objects.exists())
+
+    def test_rebuild_matches_incremental(self):
+        """Test a rebuild from scratch reproduces the incrementally folded rollups"""
+        rollups.fold_pending(settle_seconds=0)
+        Order.bulk_transition([self.first.id], 'processing')
+        rollups.fold_pending(settle_seconds=0)
+        folded = list(DailyProductSales.objects.order_by('id').values('product_id', 'units_ordered', 'revenue'))
+        call_command('rollup_sales', '--rebuild', '--settle-seconds', '0', stdout=StringIO())
+        rebuilt = list(DailyProductSales.objects.order_by('id').values('product_id', 'units_ordered', 'revenue'))
+        self.assertEqual(sorted(folded, key=str), sorted(rebuilt, key=str))
+        self.assertEqual(DailyStatusSales.objects.get(status='processing').orders, 1)
+
+    def test_reports_read_rollups(self):
+        """Test the reporting endpoints answer from the rollup tables"""
+        rollups.fold_pending(settle_seconds=0)
+        self.client.force_authenticate(user=self.admin_user)
+        with self.assertNumQueries(3):  # rollup rows, totals, watermark
+            response = self.client.get(reverse('sales-report'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totals'][0]['order_count'], 2)
+        response = self.client.get(reverse('product-sales-report'), {'limit': 1})
+        self.assertEqual(response.data['products'][0]['product_id'], self.desk.id)
+        self.assertEqual(response.data['products'][0]['net_revenue'], Decimal('100.00'))
+        response = self.client.get(reverse('sales-report'), {'start': '2026-13-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -3,6 +3,9 @@ from . import views
 
 urlpatterns = [
     path('', views.OrderListCreateView.as_view(), name='order-list-create'),
+    path('bulk-status/', views.OrderBulkStatusView.as_view(), name='order-bulk-status'),
+    path('reports/sales/', views.SalesReportView.as_view(), name='sales-report'),
+    path('reports/products/', views.ProductSalesReportView.as_view(), name='product-sales-report'),
     path('<int:order_id>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('<int:order_id>/items/', views.OrderItemDetailView.as_view(), name='order-items'),
     path('<int:order_id>/checkout/', views.CheckoutOrder.as_view(), name='checkout')
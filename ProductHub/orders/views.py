@@ -5,12 +5,14 @@ from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
 from .models import Order, OrderItem
 from cart.models import Cart
+from cart.stores import get_cart_store
 from .serializers import OrderSerializer, OrderItemSerializer
 from utils.pagination import CustomPagination
 from users.permissions import IsCustomer, IsAdmin
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.exceptions import ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
 from users.models import Customer
 import json 
 from django.shortcuts import get_object_or_404
@@ -21,6 +23,12 @@ from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view
 import hmac
 import hashlib
+from datetime import timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from . import rollups
+
+MAX_BULK_TRANSITION = 1000
 
 
 class OrderListCreateView(APIView):
@@ -28,17 +36,31 @@ class OrderListCreateView(APIView):
     pagination_class = CustomPagination
 
     @swagger_auto_schema(
-        operation_description="Get all orders for the authenticated customer",
+        operation_description="Get the authenticated customer's orders, newest first and cursor-paginated",
         tags=['Orders'],
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous or next link", type=openapi.TYPE_STRING),
+            openapi.Parameter('summary', openapi.IN_QUERY, description="Include order counts per status", type=openapi.TYPE_BOOLEAN)
+        ],
         responses={200: OrderSerializer}
     )
     def get(self, request):
         """Get all orders for the authenticated customer"""
-        orders = Order.objects.filter(customer_id=request.user.customer)
+        # Keyset paging over the immutable (customer_id, created_at, id) and one
+        # query for all the page's items: the cost does not grow with the history
+        orders = (
+            Order.objects.filter(customer_id=request.user.customer)
+            .order_by('-created_at', '-id')
+            .prefetch_related('order_items')
+        )
         paginator = self.pagination_class()
-        result_page = paginator.paginate_queryset(orders,request)
+        paginator.use_cursor = True
+        result_page = paginator.paginate_queryset(orders, request)
         serializer = OrderSerializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        response = paginator.get_paginated_response(serializer.data)
+        if request.query_params.get('summary', '').lower() in ('1', 'true', 'yes'):
+            response.data['status_summary'] = Order.status_summary(request.user.customer)
+        return response
 
     @swagger_auto_schema(
         operation_description="Create a new order with order items",
@@ -55,10 +77,8 @@ class OrderListCreateView(APIView):
     def post(self, request):
         """Create a new order from the customer's cart"""
         try:
-            # Get the customer's most recent cart
-            cart = Cart.objects.filter(
-                customer_id=request.user.customer
-            ).latest('created_at')
+            # Get the customer's most recent cart, flushed from the cart store
+            cart = get_cart_store().checkout_cart(request.user.customer)
             
             # Check if cart has items
             if not cart.cart_items.exists():
@@ -77,19 +97,7 @@ class OrderListCreateView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Add validate_cart_items method to your Cart model if not exists
-            def validate_cart_items(cart):
-                for item in cart.cart_items.select_related('product_id').all():
-                    if item.product_id.stock < item.quantity:
-                        raise ValidationError(
-                            f"Insufficient stock for product {item.product_id.name}. "
-                            f"Available: {item.product_id.stock}, Requested: {item.quantity}"
-                        )
-            
-            # Validate cart items
-            validate_cart_items(cart)
-            
-            # Create order from cart
+            # Create order from cart; validates every line against the locked products
             order = Order.create_from_cart(cart, currency=currency)
             
             # Serialize and return the created order
@@ -101,6 +109,22 @@ class OrderListCreateView(APIView):
                 {"error": "No cart found. Please create a cart first."}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        except DjangoValidationError as e:
+            return Response(
+                {
+                    "error": "Some items in your cart cannot be ordered.",
+                    "violations": [
+                        {
+                            "code": error.code,
+                            "product_id": (error.params or {}).get('product_id'),
+                            "message": message
+                        }
+                        for error in e.error_list
+                        for message in error
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except ValidationError as e:
             return Response(
                 {"error": str(e)}, 
@@ -188,6 +212,135 @@ class OrderDetailView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+class OrderBulkStatusView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Move many orders to a new status. Disallowed transitions are reported per order "
+            f"and skipped; at most {MAX_BULK_TRANSITION} orders per request"
+        ),
+        tags=['Orders'],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['order_ids', 'status'],
+            properties={
+                'order_ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                'status': openapi.Schema(type=openapi.TYPE_STRING, description='Order status'),
+                'notes': openapi.Schema(type=openapi.TYPE_STRING, description='Status history note')
+            }
+        )
+    )
+    def post(self, request):
+        """Update the status of many orders"""
+        order_ids = request.data.get('order_ids')
+        if (
+            not isinstance(order_ids, list)
+            or not order_ids
+            or not all(isinstance(order_id, int) and not isinstance(order_id, bool) for order_id in order_ids)
+        ):
+            return Response(
+                {"error": "order_ids must be a non-empty list of order IDs"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(order_ids) > MAX_BULK_TRANSITION:
+            return Response(
+                {"error": f"At most {MAX_BULK_TRANSITION} orders can be updated at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            result = Order.bulk_transition(
+                order_ids, request.data.get('status'), notes=request.data.get('notes') or ''
+            )
+        except DjangoValidationError as e:
+            return Response({"error": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+class SalesReportMixin:
+    """Date range and currency parameters shared by the sales reports"""
+    default_days = 30
+    max_days = 366
+
+    def get_range(self, request):
+        """(start, end) from ?start=&end= (YYYY-MM-DD), the last 30 days by default"""
+        try:
+            end = parse_date(request.query_params['end']) if 'end' in request.query_params else timezone.localdate()
+            start = (
+                parse_date(request.query_params['start']) if 'start' in request.query_params
+                else end - timedelta(days=self.default_days - 1)
+            )
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            raise ValidationError("start and end must be dates formatted YYYY-MM-DD")
+        if start > end or (end - start).days >= self.max_days:
+            raise ValidationError(f"start must not be after end, and the range at most {self.max_days} days")
+        return start, end
+
+    def get_currency(self, request, default=None):
+        currency = request.query_params.get('currency', default)
+        if currency is not None and currency not in dict(Order.CURRENCY_CHOICES):
+            raise ValidationError(f"Invalid currency. Choices are: {', '.join(dict(Order.CURRENCY_CHOICES).keys())}")
+        return currency
+
+
+class SalesReportView(SalesReportMixin, APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Daily order counts and amounts per status and currency, read from the sales rollups",
+        tags=['Reports'],
+        manual_parameters=[
+            openapi.Parameter('start', openapi.IN_QUERY, description="First day, YYYY-MM-DD (default 29 days before end)", type=openapi.TYPE_STRING),
+            openapi.Parameter('end', openapi.IN_QUERY, description="Last day, YYYY-MM-DD (default today)", type=openapi.TYPE_STRING),
+            openapi.Parameter('currency', openapi.IN_QUERY, description="Only this currency", type=openapi.TYPE_STRING)
+        ]
+    )
+    def get(self, request):
+        """Sales by status"""
+        try:
+            start, end = self.get_range(request)
+            currency = self.get_currency(request)
+        except ValidationError as e:
+            return Response({"error": e.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
+        report = rollups.status_report(start, end, currency)
+        return Response({'start': start, 'end': end, 'as_of': rollups.last_folded_at(), **report})
+
+
+class ProductSalesReportView(SalesReportMixin, APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Best selling products by net revenue, read from the sales rollups",
+        tags=['Reports'],
+        manual_parameters=[
+            openapi.Parameter('start', openapi.IN_QUERY, description="First day, YYYY-MM-DD (default 29 days before end)", type=openapi.TYPE_STRING),
+            openapi.Parameter('end', openapi.IN_QUERY, description="Last day, YYYY-MM-DD (default today)", type=openapi.TYPE_STRING),
+            openapi.Parameter('currency', openapi.IN_QUERY, description="Currency (default USD)", type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Number of products (default 20, max 100)", type=openapi.TYPE_INTEGER)
+        ]
+    )
+    def get(self, request):
+        """Sales by product"""
+        try:
+            start, end = self.get_range(request)
+            currency = self.get_currency(request, default='USD')
+            limit = int(request.query_params.get('limit', 20))
+            if not 1 <= limit <= 100:
+                raise ValueError
+        except ValidationError as e:
+            return Response({"error": e.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({"error": "limit must be between 1 and 100"}, status=status.HTTP_400_BAD_REQUEST)
+        products = rollups.product_report(start, end, currency, limit)
+        return Response({
+            'start': start,
+            'end': end,
+            'currency': currency,
+            'as_of': rollups.last_folded_at(),
+            'products': products
+        })
+
 class OrderItemDetailView(APIView):
     permission_classes = [IsAuthenticated, IsCustomer]
 
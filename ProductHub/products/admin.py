@@ -4,8 +4,12 @@ from .models import Product, Category, Review
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description', 'price', 'image')
+    list_display = ('name', 'description', 'price', 'image', 'avg_rating', 'review_count')
     search_fields = ('name', 'description')
+    readonly_fields = (
+        'rating_sum', 'review_count', 'avg_rating',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    )
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
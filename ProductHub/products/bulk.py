@@ -0,0 +1,96 @@
+# products/bulk.py
+"""
+Set-based price, stock and availability updates for many products at once.
+
+Each chunk of entries is applied in its own transaction with one SELECT to
+find which IDs exist and a single UPDATE that assigns every field through a
+CASE over the product ID. The cache entries of a chunk are dropped with one
+multi-delete by ProductQuerySet.update.
+"""
+from django.db import transaction
+from django.db.models import BooleanField, Case, DecimalField, F, PositiveIntegerField, Value, When
+
+from .exceptions import ProductException
+from .models import Product
+from .utils import validate_product_price
+
+BULK_FIELDS = {
+    'price': DecimalField(max_digits=10, decimal_places=2),
+    'stock': PositiveIntegerField(),
+    'is_active': BooleanField(),
+}
+MAX_BULK_ENTRIES = 10000
+
+
+def _clean_entry(entry):
+    """Validate one {id, price?, stock?, is_active?} entry and return (id, values)"""
+    if not isinstance(entry, dict):
+        raise ValueError('Each entry must be an object')
+    product_id = entry.get('id')
+    # int() would accept true, 1.9 or "12" and update the wrong product
+    if isinstance(product_id, bool) or not isinstance(product_id, int):
+        raise ValueError('A valid product id is required')
+    values = {}
+    if 'price' in entry:
+        values['price'] = validate_product_price(entry['price'])
+    if 'stock' in entry:
+        stock = entry['stock']
+        if isinstance(stock, bool) or not isinstance(stock, int) or stock < 0:
+            raise ValueError('stock must be a non-negative integer')
+        values['stock'] = stock
+    if 'is_active' in entry:
+        if not isinstance(entry['is_active'], bool):
+            raise ValueError('is_active must be true or false')
+        values['is_active'] = entry['is_active']
+    if not values:
+        raise ValueError('Nothing to update: pass price, stock or is_active')
+    return product_id, values
+
+
+def apply_bulk_updates(entries, chunk_size=500):
+    """
+    Apply bulk product updates and return one outcome per entry, each with
+    a status of updated, not_found or invalid.
+    """
+    results = []
+    pending = {}
+    for entry in entries:
+        try:
+            product_id, values = _clean_entry(entry)
+        except (ProductException, ValueError) as e:
+            results.append({'id': entry.get('id') if isinstance(entry, dict) else None,
+                            'status': 'invalid', 'error': str(getattr(e, 'detail', e))})
+            continue
+        if product_id in pending:
+            results.append({'id': product_id, 'status': 'invalid', 'error': 'Duplicate id in request'})
+            continue
+        pending[product_id] = values
+
+    product_ids = list(pending)
+    for start in range(0, len(product_ids), chunk_size):
+        chunk = {product_id: pending[product_id] for product_id in product_ids[start:start + chunk_size]}
+        results.extend(_apply_chunk(chunk))
+    return results
+
+
+def _apply_chunk(chunk):
+    with transaction.atomic():
+        existing = set(
+            Product.objects.filter(id__in=chunk).select_for_update().values_list('id', flat=True)
+        )
+        assignments = {}
+        for field, output_field in BULK_FIELDS.items():
+            whens = [
+                When(id=product_id, then=Value(values[field], output_field=output_field))
+                for product_id, values in chunk.items()
+                if product_id in existing and field in values
+            ]
+            if whens:
+                assignments[field] = Case(*whens, default=F(field), output_field=output_field)
+        if assignments:
+            Product.objects.for_ids(sorted(existing)).update(**assignments)
+
+    return [
+        {'id': product_id, 'status': 'updated' if product_id in existing else 'not_found'}
+        for product_id in chunk
+    ]
@@ -0,0 +1,331 @@
+# products/caching.py
+"""
+Caching for the product catalog.
+
+Cached catalog responses are keyed by the current catalog version. Any write
+that can change a list page bumps the version, so later reads miss and stale
+entries simply age out without scanning or deleting keys. The category
+listing has its own version, bumped only when a category or its membership
+changes.
+
+Individual products are cached in two tiers: a small per-process LRU with a
+short TTL in front of the shared cache. Missing IDs are cached as well, and
+a recomputation of a single key is guarded so only one worker hits the
+database while the others wait for its result. Their keys carry a product
+generation as well, bumped by bulk writes too wide to list the products they
+touch; each process re-reads it at most once per local TTL, the same delay
+its local tier already allows.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'catalog_version'
+CATEGORY_VERSION_KEY = 'category_version'
+PRODUCT_VERSION_KEY = 'product_version'
+LIST_CACHE_HITS_KEY = 'product_list_cache_hits'
+LIST_CACHE_MISSES_KEY = 'product_list_cache_misses'
+
+PRODUCT_CACHE_TIMEOUT = 3600
+MISSING_PRODUCT_TIMEOUT = 60
+SINGLE_FLIGHT_LOCK_TIMEOUT = 10
+SINGLE_FLIGHT_WAIT = 1.0
+# Stored in place of a product whose ID does not exist
+MISSING = '__missing__'
+
+
+def get_list_cache_timeout():
+    return getattr(settings, 'PRODUCT_LIST_CACHE_TIMEOUT', 300)
+
+
+def get_category_list_cache_timeout():
+    return getattr(settings, 'CATEGORY_LIST_CACHE_TIMEOUT', 3600)
+
+
+def _get_version(key):
+    """Current generation stored under key, seeded from the clock if it was evicted"""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _incr_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def _bump_version(key):
+    # Bumped again once the surrounding transaction commits so a read racing
+    # the write cannot cache pre-commit rows under the new generation
+    _incr_version(key)
+    transaction.on_commit(lambda: _incr_version(key))
+
+
+def get_catalog_version():
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Start a new catalog generation"""
+    _bump_version(CATALOG_VERSION_KEY)
+
+
+def get_category_version():
+    return _get_version(CATEGORY_VERSION_KEY)
+
+
+def bump_category_version():
+    """Start a new generation of the category listing"""
+    _bump_version(CATEGORY_VERSION_KEY)
+
+
+def product_list_cache_key(request):
+    """Cache key for a product list request, from its normalized query parameters"""
+    params = sorted(
+        (key, value.strip())
+        for key, values in request.query_params.lists()
+        for value in values
+        if value.strip()
+    )
+    # The path keeps the public and admin listings apart
+    digest = hashlib.sha256(
+        f'{request.get_host()}{request.path}?{urlencode(params)}'.encode('utf-8')
+    ).hexdigest()
+    return f'product_list:{get_catalog_version()}:{digest}'
+
+
+def category_list_cache_key(request):
+    """
+    Cache key for a category list request. Categories are keyed by their own
+    version, so product writes that leave membership alone keep it warm.
+    """
+    digest = hashlib.sha256(
+        f'{request.get_host()}?{request.GET.urlencode()}'.encode('utf-8')
+    ).hexdigest()
+    return f'category_list:{get_category_version()}:{digest}'
+
+
+def _incr_counter(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def record_list_cache_lookup(hit):
+    _incr_counter(LIST_CACHE_HITS_KEY if hit else LIST_CACHE_MISSES_KEY)
+
+
+def get_list_cache_stats():
+    counters = cache.get_many([LIST_CACHE_HITS_KEY, LIST_CACHE_MISSES_KEY])
+    hits = counters.get(LIST_CACHE_HITS_KEY, 0)
+    misses = counters.get(LIST_CACHE_MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / lookups if lookups else 0,
+        'catalog_version': get_catalog_version(),
+        'timeout': get_list_cache_timeout()
+    }
+
+
+def reset_list_cache_stats():
+    cache.delete_many([LIST_CACHE_HITS_KEY, LIST_CACHE_MISSES_KEY])
+
+
+class LocalLRUCache:
+    """
+    Bounded, thread-safe per-process cache whose entries expire after timeout
+    seconds. Values are copied in and out, so a caller changing the object it
+    got cannot affect other requests.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                found[key] = copy.copy(value)
+        return found
+
+    def set_many(self, values):
+        expires_at = time.monotonic() + self.timeout
+        with self._lock:
+            for key, value in values.items():
+                self._data[key] = (expires_at, copy.copy(value))
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_product_cache = LocalLRUCache(
+    max_size=getattr(settings, 'PRODUCT_LOCAL_CACHE_SIZE', 1024),
+    timeout=getattr(settings, 'PRODUCT_LOCAL_CACHE_TIMEOUT', 5)
+)
+_single_flight_locks = [threading.Lock() for _ in range(64)]
+_product_version = (0, None)  # (expires at, version) read by this process
+
+
+def get_product_version():
+    global _product_version
+    expires_at, version = _product_version
+    if version is None or expires_at < time.monotonic():
+        version = _get_version(PRODUCT_VERSION_KEY)
+        _product_version = (time.monotonic() + local_product_cache.timeout, version)
+    return version
+
+
+def product_cache_key(product_id, version=None):
+    if version is None:
+        version = get_product_version()
+    return f'product:{version}:{product_id}'
+
+
+def product_card_key(product_id, version=None):
+    if version is None:
+        version = get_product_version()
+    return f'product_card:{version}:{product_id}'
+
+
+def _store_products(values):
+    """Write loaded products (or MISSING markers) to both tiers"""
+    found = {key: value for key, value in values.items() if value != MISSING}
+    missing = {key: value for key, value in values.items() if value == MISSING}
+    if found:
+        cache.set_many(found, timeout=PRODUCT_CACHE_TIMEOUT)
+    if missing:
+        cache.set_many(missing, timeout=MISSING_PRODUCT_TIMEOUT)
+    local_product_cache.set_many(values)
+
+
+def get_cached_product(product_id, load):
+    """
+    Return the product with the given ID, or None if it does not exist.
+    ``load(ids)`` fetches ``{id: product}`` from the database.
+    """
+    key = product_cache_key(product_id)
+    value = local_product_cache.get_many([key]).get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is None:
+            value = _single_flight(key, lambda: load([product_id]).get(product_id, MISSING))
+        local_product_cache.set_many({key: value})
+    return None if value == MISSING else value
+
+
+def _single_flight(key, compute):
+    """Recompute key once across threads and processes; others wait for the result"""
+    lock_key = f'{key}:lock'
+    with _single_flight_locks[hash(key) % len(_single_flight_locks)]:
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.add(lock_key, 1, timeout=SINGLE_FLIGHT_LOCK_TIMEOUT):
+            try:
+                value = compute()
+                _store_products({key: value})
+            finally:
+                cache.delete(lock_key)
+            return value
+        deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        # The worker holding the lock is too slow; compute without caching
+        return compute()
+
+
+def get_cached_products(product_ids, load):
+    """
+    Return ``{id: product}`` for the given IDs with at most one shared cache
+    round-trip and one database query. IDs that do not exist are omitted.
+    """
+    version = get_product_version()
+    keys = {product_cache_key(product_id, version): product_id for product_id in set(product_ids)}
+    values = local_product_cache.get_many(keys)
+    pending = [key for key in keys if key not in values]
+    if pending:
+        shared = cache.get_many(pending)
+        local_product_cache.set_many(shared)
+        values.update(shared)
+        pending = [key for key in pending if key not in shared]
+    if pending:
+        loaded = load([keys[key] for key in pending])
+        fetched = {key: loaded.get(keys[key], MISSING) for key in pending}
+        _store_products(fetched)
+        values.update(fetched)
+    return {
+        keys[key]: value for key, value in values.items() if value != MISSING
+    }
+
+
+def invalidate_products(product_ids):
+    """
+    Drop products from both cache tiers, along with their list cards, and
+    start a new catalog generation
+    """
+    version = get_product_version()
+    keys = [product_cache_key(product_id, version) for product_id in product_ids]
+    card_keys = [product_card_key(product_id, version) for product_id in product_ids]
+    if keys:
+        def delete_keys():
+            cache.delete_many(keys + card_keys)
+            local_product_cache.delete_many(keys)
+        # Again after commit, in case a reader re-cached pre-commit rows
+        delete_keys()
+        transaction.on_commit(delete_keys)
+    bump_catalog_version()
+
+
+def invalidate_all_products():
+    """
+    Start a new product generation, orphaning every cached product and card,
+    and a new catalog generation; for bulk writes that do not know their IDs
+    """
+    def reset_local():
+        global _product_version
+        _product_version = (0, None)
+        local_product_cache.clear()
+
+    _bump_version(PRODUCT_VERSION_KEY)
+    reset_local()
+    transaction.on_commit(reset_local)
+    bump_catalog_version()
@@ -0,0 +1,51 @@
+# products/cards.py
+"""
+Pre-rendered product cards for the product list.
+
+A card is the full ProductListSerializer representation of one product,
+encoded to JSON once and kept in the cache. A list page is assembled from the
+cards of its product IDs and the renderer copies them into the response as
+they are, so a page of cached cards needs no serializer and no encoding.
+Cards are dropped by invalidate_products (or orphaned by
+invalidate_all_products), i.e. whenever the product, its reviews or its
+category links change; category renames and deletes invalidate the cards of
+their products as well.
+"""
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from utils.renderers import PreRendered, dumps
+from .caching import PRODUCT_CACHE_TIMEOUT, get_product_version, product_card_key
+from .models import Category, Product
+from .serializers import ProductListSerializer
+
+
+def render_cards(products):
+    """Encode {id: card bytes} for fully loaded products"""
+    serializer = ProductListSerializer(products, many=True)
+    return {item['id']: dumps(item) for item in serializer.data}
+
+
+def get_product_cards(product_ids):
+    """
+    Cards for product_ids in the same order, missing products skipped. One
+    cache round-trip, plus two queries for the products without a card.
+    """
+    version = get_product_version()
+    keys = {product_id: product_card_key(product_id, version) for product_id in product_ids}
+    cached = cache.get_many(keys.values())
+    cards = {product_id: cached[key] for product_id, key in keys.items() if key in cached}
+
+    missing = [product_id for product_id in keys if product_id not in cards]
+    if missing:
+        products = Product.objects.filter(id__in=missing).prefetch_related(
+            Prefetch('categories', queryset=Category.objects.only('id', 'name'))
+        )
+        rendered = render_cards(products)
+        cache.set_many(
+            {keys[product_id]: card for product_id, card in rendered.items()},
+            timeout=PRODUCT_CACHE_TIMEOUT
+        )
+        cards.update(rendered)
+
+    return [PreRendered(cards[product_id]) for product_id in product_ids if product_id in cards]
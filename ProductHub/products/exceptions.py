@@ -37,3 +37,15 @@ class InvalidRating(ProductException):
     status_code = status.HTTP_400_BAD_REQUEST
     default_detail = 'Invalid rating'
     default_code = 'invalid_rating'
+
+
+class InvalidFacetParameter(ProductException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Invalid facet parameter'
+    default_code = 'invalid_facet_parameter'
+
+
+class InvalidImportFile(ProductException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Invalid import file'
+    default_code = 'invalid_import_file'
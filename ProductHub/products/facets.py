@@ -0,0 +1,76 @@
+# products/facets.py
+"""
+Facet counts for the product list. Each facet is one grouped query over the
+already-filtered product queryset, so the cost does not grow with the number
+of categories or price buckets.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, DecimalField, F, Value
+from django.db.models.functions import Floor
+
+from .exceptions import InvalidFacetParameter
+from .models import Category
+
+FACETS = ('categories', 'price')
+DEFAULT_PRICE_INTERVAL = Decimal('50')
+
+
+def parse_facets(value):
+    """Requested facet names from a ?facets= value"""
+    if not value:
+        return []
+    requested = {name.strip() for name in value.split(',')}
+    return [name for name in FACETS if name in requested]
+
+
+def parse_price_interval(value):
+    if not value:
+        return DEFAULT_PRICE_INTERVAL
+    try:
+        interval = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        interval = None
+    if interval is None or not interval.is_finite() or interval <= 0:
+        raise InvalidFacetParameter('price_interval must be a positive number')
+    return interval
+
+
+def category_facet(queryset):
+    """Number of matching products per category, through the category M2M table"""
+    rows = (
+        Category.product_id.through.objects
+        .filter(product__in=queryset.order_by().values('id'))
+        .values('category_id', 'category__name')
+        .annotate(count=Count('product_id', distinct=True))
+        .order_by('-count', 'category__name')
+    )
+    return [
+        {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def price_facet(queryset, interval):
+    """Histogram of matching products in price buckets of the given width"""
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=Floor(F('price') / Value(interval, output_field=DecimalField())))
+        .values('bucket')
+        .annotate(count=Count('id', distinct=True))
+        .order_by('bucket')
+    )
+    facet = []
+    for row in rows:
+        low = int(row['bucket']) * interval
+        facet.append({'min': str(low), 'max': str(low + interval), 'count': row['count']})
+    return facet
+
+
+def compute_facets(queryset, names, price_interval=DEFAULT_PRICE_INTERVAL):
+    facets = {}
+    if 'categories' in names:
+        facets['categories'] = category_facet(queryset)
+    if 'price' in names:
+        facets['price'] = price_facet(queryset, price_interval)
+    return facets
@@ -0,0 +1,156 @@
+# products/images.py
+"""
+Resized derivatives of product images.
+
+Uploads are checked by decoding their header with Pillow rather than trusting
+the file extension. After the product is committed, a background worker
+decodes the original once and writes thumbnail, card and detail variants in
+WebP and JPEG. Variant files are named after a hash of the source image and
+the variant spec, so identical uploads share files and an existing variant
+is never encoded twice.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .exceptions import InvalidImageFormat
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG'}
+VARIANT_SIZES = {
+    'thumbnail': (150, 150),
+    'card': (400, 400),
+    'detail': (1200, 1200),
+}
+OUTPUT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+VARIANT_DIR = 'uploads/products/variants'
+
+_executor = None
+
+
+def verify_image_format(image):
+    """Check the real format of an uploaded file by parsing it with Pillow"""
+    try:
+        with Image.open(image) as decoded:
+            image_format = decoded.format
+            decoded.verify()
+    except Image.DecompressionBombError:
+        raise InvalidImageFormat('Image dimensions are too large')
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        raise InvalidImageFormat('Uploaded file is not a valid image')
+    finally:
+        image.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        raise InvalidImageFormat(
+            'Invalid image format. Allowed formats: JPG, JPEG, PNG'
+        )
+    return image_format
+
+
+def variant_path(source_digest, name, extension):
+    width, height = VARIANT_SIZES[name]
+    return f'{VARIANT_DIR}/{source_digest[:32]}_{name}_{width}x{height}.{extension}'
+
+
+def _encode(image, image_format, options):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def build_variants(source_bytes):
+    """
+    Write every missing variant of the source image and return their storage
+    paths as ``{variant: {extension: path}}``.
+    """
+    digest = hashlib.sha256(source_bytes).hexdigest()
+    paths = {
+        name: {extension: variant_path(digest, name, extension) for extension in OUTPUT_FORMATS}
+        for name in VARIANT_SIZES
+    }
+    missing = [
+        (name, extension) for name, formats in paths.items()
+        for extension, path in formats.items() if not default_storage.exists(path)
+    ]
+    if not missing:
+        return paths
+
+    with Image.open(io.BytesIO(source_bytes)) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if original.has_transparency_data else 'RGB')
+        resized = {}
+        for name, extension in missing:
+            if name not in resized:
+                resized[name] = original.copy()
+                resized[name].thumbnail(VARIANT_SIZES[name], Image.Resampling.LANCZOS)
+            image_format, options = OUTPUT_FORMATS[extension]
+            content = _encode(resized[name], image_format, options)
+            default_storage.save(paths[name][extension], ContentFile(content))
+    return paths
+
+
+def generate_product_variants(product_id):
+    """
+    Build the variants of a product's current image and store their paths.
+    Returns None, leaving the product without variants, when it has no image
+    or its image has too many pixels to decode safely.
+    """
+    from .models import Product
+
+    product = Product.objects.filter(id=product_id).only('id', 'image').first()
+    if product is None or not product.image:
+        return None
+    with product.image.open('rb') as source:
+        source_bytes = source.read()
+    try:
+        variants = build_variants(source_bytes)
+    except Image.DecompressionBombError as e:
+        logger.warning('Skipping image variants for product %s: %s', product_id, e)
+        return None
+    Product.objects.for_ids([product_id]).update(image_variants=variants)
+    return variants
+
+
+def _run_in_worker(product_id):
+    close_old_connections()
+    try:
+        generate_product_variants(product_id)
+    except Exception:
+        logger.exception('Image variant generation failed for product %s', product_id)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2),
+            thread_name_prefix='product-images'
+        )
+    return _executor
+
+
+def schedule_product_variants(product_id):
+    """
+    Generate variants once the current transaction commits, on the background
+    worker pool unless PRODUCT_IMAGE_VARIANTS_ASYNC is False.
+    """
+    if getattr(settings, 'PRODUCT_IMAGE_VARIANTS_ASYNC', True):
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, product_id))
+    else:
+        transaction.on_commit(lambda: generate_product_variants(product_id))
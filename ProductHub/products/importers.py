@@ -0,0 +1,253 @@
+# products/importers.py
+"""
+Streaming bulk import of products from CSV or JSON Lines files.
+
+Rows are validated in memory and written in batches: every category referenced
+by a batch is resolved with one query, products go in with one bulk INSERT
+and their category links with another on the M2M through table. A bad row is
+reported with its line number and skipped; it never aborts its batch.
+
+Files must be UTF-8; anything else stops the import with InvalidImportFile.
+CSV files need a header row. ``categories`` holds category IDs separated by
+``|`` in CSV files and a list of IDs in JSON Lines files.
+"""
+import csv
+import io
+import json
+import uuid
+
+from django.db import DatabaseError, connection, transaction
+
+from .caching import invalidate_products
+from .exceptions import InvalidImportFile, ProductException
+from .models import Category, Product
+from .search import get_search_backend
+from .suggest import index_product
+from .utils import validate_product_price
+
+FORMATS = ('csv', 'jsonl')
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', ''}
+
+
+def detect_format(filename):
+    """File format from a file name, or None if it is not recognised"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return 'csv'
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    return None
+
+
+class ImportReport:
+    max_errors = 1000
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': self.error_count,
+            'errors': self.errors
+        }
+
+
+class ProductImporter:
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.through = Category.product_id.through
+
+    def run(self, stream, file_format):
+        """Import every row of a binary or text stream and return an ImportReport"""
+        if file_format not in FORMATS:
+            raise ProductException(f'Unsupported import format: {file_format}')
+        report = ImportReport()
+        batch = []
+        rows = self.read_rows(stream, file_format, report)
+        while True:
+            try:
+                line, row = next(rows)
+            except StopIteration:
+                break
+            except UnicodeDecodeError:
+                # Batches written before this point stay imported
+                raise InvalidImportFile(
+                    f'Import file is not valid UTF-8 after row {report.rows}; '
+                    f'{report.created} products were imported'
+                )
+            report.rows += 1
+            try:
+                batch.append((line, *self.build_product(row)))
+            except (ProductException, ValueError, TypeError) as e:
+                report.add_error(line, self._message(e))
+                continue
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch, report)
+                batch = []
+        if batch:
+            self.write_batch(batch, report)
+        return report
+
+    def read_rows(self, stream, file_format, report):
+        if isinstance(stream.read(0), bytes):
+            stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        if file_format == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError:
+                report.rows += 1
+                report.add_error(line, 'Invalid JSON')
+                continue
+            if not isinstance(row, dict):
+                report.rows += 1
+                report.add_error(line, 'Each line must be a JSON object')
+                continue
+            yield line, row
+
+    def build_product(self, row):
+        """Validate one row and return an unsaved Product and its category IDs"""
+        name = str(row.get('name') or '').strip()
+        description = str(row.get('description') or '').strip()
+        if not name or len(name) > 50:
+            raise ValueError('name is required and must be at most 50 characters')
+        if not description or len(description) > 200:
+            raise ValueError('description is required and must be at most 200 characters')
+        product = Product(
+            name=name,
+            description=description,
+            price=validate_product_price(row.get('price')),
+            image=str(row.get('image') or ''),
+            stock=self._non_negative_int(row, 'stock', 0),
+            max_quantity_per_order=self._non_negative_int(row, 'max_quantity_per_order', 10),
+            is_active=self._bool(row, 'is_active', True),
+        )
+        return product, self._category_ids(row.get('categories'))
+
+    def write_batch(self, batch, report):
+        referenced = {category_id for _, _, category_ids in batch for category_id in category_ids}
+        known = set(Category.objects.filter(id__in=referenced).values_list('id', flat=True))
+
+        valid = []
+        for line, product, category_ids in batch:
+            unknown = sorted(set(category_ids) - known)
+            if unknown:
+                report.add_error(line, f'Unknown category ids: {unknown}')
+            else:
+                valid.append((line, product, category_ids))
+        if not valid:
+            return
+
+        products = [product for _, product, _ in valid]
+        try:
+            with transaction.atomic():
+                self._bulk_insert(products)
+                self.through.objects.bulk_create(
+                    [
+                        self.through(category_id=category_id, product_id=product.id)
+                        for _, product, category_ids in valid
+                        for category_id in category_ids
+                    ],
+                    batch_size=self.batch_size,
+                    ignore_conflicts=True
+                )
+                # The bulk insert into the through table sends no m2m_changed
+                Category.refresh_product_counts(
+                    {category_id for _, _, category_ids in valid for category_id in category_ids}
+                )
+        except DatabaseError as e:
+            for line, _, _ in valid:
+                report.add_error(line, f'Database error: {e}')
+            return
+
+        get_search_backend().index_many(products)
+        for product in products:
+            index_product(product)
+        invalidate_products([product.id for product in products])
+        report.created += len(products)
+
+    def _bulk_insert(self, products):
+        if connection.features.can_return_rows_from_bulk_insert:
+            Product.objects.bulk_create(products, batch_size=self.batch_size)
+            return
+        # MySQL does not return the new primary keys. Insert every row under a
+        # placeholder name unique to this batch, read the IDs back through the
+        # name index and restore the names before the transaction commits, so
+        # no other client ever sees a placeholder and rows inserted
+        # concurrently, even with the same names, are never matched.
+        token = uuid.uuid4().hex
+        names = {}
+        for position, product in enumerate(products):
+            placeholder = f'{token}:{position}'
+            names[placeholder] = product.name
+            product.name = placeholder
+        try:
+            Product.objects.bulk_create(products, batch_size=self.batch_size)
+            by_placeholder = {product.name: product for product in products}
+            inserted = Product.objects.filter(name__in=list(names)).values_list('id', 'name')
+            for product_id, placeholder in inserted:
+                by_placeholder.pop(placeholder).id = product_id
+            if by_placeholder:
+                raise DatabaseError('Could not resolve the IDs of imported products')
+        finally:
+            for product in products:
+                product.name = names[product.name]
+        # The base manager skips ProductQuerySet's cache and index upkeep,
+        # which write_batch does for the whole batch once it commits
+        Product._base_manager.bulk_update(products, ['name'], batch_size=self.batch_size)
+
+    @staticmethod
+    def _message(error):
+        detail = getattr(error, 'detail', None)
+        return str(detail if detail is not None else error)
+
+    @staticmethod
+    def _non_negative_int(row, field, default):
+        value = row.get(field)
+        if value in (None, ''):
+            return default
+        number = int(value)
+        if number < 0:
+            raise ValueError(f'{field} must not be negative')
+        return number
+
+    @staticmethod
+    def _bool(row, field, default):
+        value = row.get(field)
+        if value is None:
+            return default
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False if text else default
+        raise ValueError(f'{field} must be a boolean')
+
+    @staticmethod
+    def _category_ids(value):
+        if value in (None, ''):
+            return []
+        if isinstance(value, str):
+            value = [part for part in value.split('|') if part.strip()]
+        if not isinstance(value, list):
+            raise ValueError('categories must be a list of category ids')
+        return sorted({int(category_id) for category_id in value})
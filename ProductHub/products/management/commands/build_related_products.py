@@ -0,0 +1,111 @@
+import heapq
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from orders.models import OrderItem
+from products.models import RelatedProduct
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the "frequently bought together" table from order lines. The lines are '
+        'read once, in order ID ranges, and each product keeps counters for a bounded '
+        'number of candidate partners, so memory depends on the catalog size only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Related products kept per product')
+        parser.add_argument(
+            '--min-count',
+            type=int,
+            default=2,
+            help='Orders two products must share before they are related'
+        )
+        parser.add_argument(
+            '--candidates',
+            type=int,
+            default=None,
+            help='Partner counters kept per product while counting (default: 5 x --top)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Range of order IDs read per query'
+        )
+
+    def handle(self, *args, **options):
+        top = options['top']
+        capacity = max(top, options['candidates'] or 5 * top)
+        last_order_id = OrderItem.objects.aggregate(last=Max('order_id'))['last'] or 0
+
+        counters = {}
+        for basket in self.baskets(options['batch_size'], last_order_id):
+            if len(basket) < 2:
+                continue
+            for product_id in basket:
+                self.count_partners(counters.setdefault(product_id, {}), basket - {product_id}, capacity)
+        rows = self.top_related(counters, top, options['min_count'])
+
+        # Readers keep the previous table until the rebuild commits
+        with transaction.atomic():
+            RelatedProduct.objects.all().delete()
+            RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {len(rows)} related product links for {len(counters)} products'
+        ))
+
+    def baskets(self, batch_size, last_order_id):
+        """Yield the set of product IDs of each non-cancelled order"""
+        start = 0
+        while start < last_order_id:
+            end = start + batch_size
+            lines = (
+                OrderItem.objects
+                .filter(order_id__gt=start, order_id__lte=end)
+                .exclude(order_id__status='cancelled')
+                .order_by('order_id')
+                .values_list('order_id', 'product_id')
+            )
+            for _, items in groupby(lines, key=itemgetter(0)):
+                yield {product_id for _, product_id in items}
+            start = end
+
+    @staticmethod
+    def count_partners(counter, partners, capacity):
+        """
+        Space-Saving count of partners in counter, {partner: [count, error]}.
+        Once capacity partners are tracked, a new one replaces the least
+        counted and inherits its count as error, so every partner bought with
+        the product in more than 1/capacity of its orders is kept.
+        """
+        for partner in partners:
+            entry = counter.get(partner)
+            if entry is not None:
+                entry[0] += 1
+            elif len(counter) < capacity:
+                counter[partner] = [1, 0]
+            else:
+                evicted = min(counter, key=lambda related_id: counter[related_id][0])
+                count = counter.pop(evicted)[0]
+                counter[partner] = [count + 1, count]
+
+    def top_related(self, counters, top, min_count):
+        rows = []
+        for product_id, counter in counters.items():
+            # Orders guaranteed to contain both; exact unless partners were evicted
+            best = heapq.nsmallest(
+                top,
+                ((error - count, related_id) for related_id, (count, error) in counter.items()
+                 if count - error >= min_count)
+            )
+            rows.extend(
+                RelatedProduct(product_id_id=product_id, related_id_id=related_id, score=-negated, rank=rank)
+                for rank, (negated, related_id) in enumerate(best, start=1)
+            )
+        return rows
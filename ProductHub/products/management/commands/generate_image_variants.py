@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from products.images import generate_product_variants
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate resized image variants for existing products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only process products that have no variants yet'
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='')
+        if options['missing_only']:
+            products = products.filter(image_variants={})
+        processed = skipped = failed = 0
+        for product_id in products.values_list('id', flat=True).iterator():
+            try:
+                variants = generate_product_variants(product_id)
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write(f'Product {product_id}: {e}')
+                continue
+            if variants is None:
+                # Image too large to decode safely, or removed meanwhile
+                skipped += 1
+                self.stderr.write(f'Product {product_id}: skipped')
+            else:
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated variants for {processed} products, {skipped} skipped, {failed} failed'
+        ))
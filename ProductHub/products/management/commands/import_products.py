@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.exceptions import InvalidImportFile
+from products.importers import FORMATS, ProductImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Stream products from a CSV or JSON Lines file into the catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON Lines file to import')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format, detected from the file extension by default'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows validated and inserted together'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        if file_format is None:
+            raise CommandError('Cannot detect the file format, pass --format')
+
+        importer = ProductImporter(batch_size=options['batch_size'])
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                report = importer.run(stream, file_format)
+        except (OSError, InvalidImportFile) as e:
+            raise CommandError(str(e))
+
+        for error in report.errors:
+            self.stderr.write(f"Row {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.created} of {report.rows} rows, {report.error_count} failed'
+        ))
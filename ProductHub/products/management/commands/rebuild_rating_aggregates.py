@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from products.models import Product, Review
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized rating aggregates of every product from the review table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of products updated per bulk UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        star_counts = {
+            f'rating_{star}_count': Count('id', filter=Q(rating=star))
+            for star in range(1, 6)
+        }
+        aggregates = {
+            row['product_id']: row
+            for row in Review.objects.order_by().values('product_id').annotate(
+                rating_sum=Sum('rating'),
+                review_count=Count('id'),
+                **star_counts
+            )
+        }
+
+        fields = ['rating_sum', 'review_count', 'avg_rating', *star_counts]
+        updated = 0
+        batch = []
+        with transaction.atomic():
+            for product in Product.objects.only('id').iterator(chunk_size=batch_size):
+                row = aggregates.get(product.id, {})
+                product.rating_sum = row.get('rating_sum') or 0
+                product.review_count = row.get('review_count') or 0
+                product.avg_rating = (
+                    product.rating_sum / product.review_count if product.review_count else 0
+                )
+                for field in star_counts:
+                    setattr(product, field, row.get(field) or 0)
+                batch.append(product)
+                if len(batch) >= batch_size:
+                    updated += self._flush(batch, fields)
+                    batch = []
+            if batch:
+                updated += self._flush(batch, fields)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} products'))
+
+    def _flush(self, batch, fields):
+        # bulk_update goes through ProductQuerySet.update, which invalidates the cache
+        Product.objects.bulk_update(batch, fields)
+        return len(batch)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute Category.product_count where it has drifted from the category membership table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted categories without updating them'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = list(
+                Category.objects
+                .annotate(actual=Count('product_id'))
+                .exclude(product_count=F('actual'))
+                .values_list('id', 'product_count', 'actual')
+            )
+            for category_id, stored, actual in drifted:
+                self.stdout.write(f'Category {category_id}: stored {stored}, actual {actual}')
+            if drifted and not options['dry_run']:
+                # Only drifted rows, so the others keep their updated_at and ETags
+                Category.refresh_product_counts([category_id for category_id, _, _ in drifted])
+
+        action = 'Found' if options['dry_run'] else 'Reconciled'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(drifted)} drifted categories'))
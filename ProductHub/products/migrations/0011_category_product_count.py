@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-17 20:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_product_counts(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Membership = Category.product_id.through
+    counts = (
+        Membership.objects
+        .filter(category_id=OuterRef('pk'))
+        .order_by()
+        .values('category_id')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    Category.objects.update(product_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_category_updated_at_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_product_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_related_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='import_key',
+            field=models.CharField(blank=True, editable=False, max_length=48, null=True, unique=True),
+        ),
+    ]
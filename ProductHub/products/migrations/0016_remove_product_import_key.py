@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-17 21:11
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_product_import_key'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='product',
+            name='import_key',
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-17 21:14
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_posted_at(apps, schema_editor):
+    """The last edit is the earliest time still known for existing reviews"""
+    Review = apps.get_model('products', 'Review')
+    Review.objects.update(posted_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_remove_product_import_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='posted_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_posted_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product_id', 'posted_at', 'id'], name='review_product_posted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product_id', 'rating', 'posted_at', 'id'], name='review_product_rating_post_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_product_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_product_rating_idx',
+        ),
+    ]
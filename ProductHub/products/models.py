@@ -1,5 +1,89 @@
 from django.db import models
-from django.core.cache import cache
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .caching import (
+    bump_category_version,
+    get_cached_product,
+    get_cached_products,
+    invalidate_all_products,
+    invalidate_products,
+)
+from .search import get_search_backend
+from .suggest import refresh_products
+
+SUGGEST_FIELDS = {'name', 'is_active', 'avg_rating', 'review_count'}
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Bulk updates and deletes bypass Product.save/delete, so they invalidate
+    the cached copies of the affected products themselves, or every cached
+    product when an update is not limited with for_ids. Updates also bump
+    updated_at, which auto_now only does on save(), and refresh renamed,
+    (de)activated or re-rated products in the autocomplete index and
+    products whose indexed text changed in the search backend.
+    """
+    _known_ids = None
+
+    def active(self):
+        """Sellable products, the only ones the public catalog reads"""
+        return self.filter(is_active=True)
+
+    def for_ids(self, product_ids):
+        """Filter to product_ids, letting bulk writes skip the affected-ID lookup"""
+        queryset = self.filter(id__in=product_ids)
+        queryset._known_ids = list(product_ids)
+        return queryset
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._known_ids = self._known_ids
+        return clone
+
+    def _affected_ids(self):
+        if self._known_ids is not None:
+            return self._known_ids
+        return list(self.values_list('id', flat=True))
+
+    def update(self, **kwargs):
+        backend = get_search_backend()
+        reindex = backend.indexed_fields.intersection(kwargs)
+        # Fields the suggest index matches or ranks on, e.g. apply_review_delta's
+        refresh = SUGGEST_FIELDS.intersection(kwargs)
+        # Other wide updates start a new product cache generation instead of
+        # reading the IDs they touch
+        product_ids = self._known_ids
+        if product_ids is None and (reindex or refresh):
+            product_ids = list(self.values_list('id', flat=True))
+        kwargs.setdefault('updated_at', timezone.now())
+        rows = super().update(**kwargs)
+        if product_ids is None:
+            invalidate_all_products()
+            return rows
+        invalidate_products(product_ids)
+        if refresh:
+            refresh_products(product_ids)
+        if reindex and product_ids:
+            backend.index_many(
+                self.model.objects.filter(id__in=product_ids).only('id', *backend.indexed_fields)
+            )
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        product_ids = self._affected_ids()
+        result = super().delete()
+        for product_id in product_ids:
+            get_search_backend().remove(product_id)
+        invalidate_products(product_ids)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 # Create your models here.
 class Product(models.Model):
@@ -7,32 +91,105 @@ class Product(models.Model):
     description = models.TextField(max_length=200)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='uploads/products/')
+    # {variant: {extension: storage path}}, filled in by products.images
+    image_variants = models.JSONField(default=dict, blank=True)
     stock = models.PositiveIntegerField(default=0)
     max_quantity_per_order = models.PositiveIntegerField(default=10)
     is_active = models.BooleanField(default=True)
-    
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Denormalized review aggregates, maintained by the Review signals
+    rating_sum = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    avg_rating = models.FloatField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         db_table = 'product'
         indexes = [
             models.Index(fields=['name']),
             models.Index(fields=['price']),
+            models.Index(fields=['avg_rating']),
+            # The public catalog filters on is_active before every sort. A
+            # partial index would be smaller but MySQL cannot build one.
+            models.Index(fields=['is_active', 'price'], name='product_active_price_idx'),
+            models.Index(fields=['is_active', 'name'], name='product_active_name_idx'),
+            models.Index(fields=['is_active', 'avg_rating'], name='product_active_rating_idx'),
         ]
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        cache.delete(f'product_{self.id}')
+        get_search_backend().index(self)
+        invalidate_products([self.id])
 
+    def delete(self, *args, **kwargs):
+        product_id = self.id
+        result = super().delete(*args, **kwargs)
+        get_search_backend().remove(product_id)
+        invalidate_products([product_id])
+        return result
+
+    @classmethod
+    def _load_many(cls, product_ids):
+        return cls.objects.in_bulk(product_ids)
 
     @classmethod
     def get_cached(cls, product_id):
-        cache_key = f'product_{product_id}'
-        product = cache.get(cache_key)
-        if not product:
-            product = cls.objects.get(id=product_id)
-            cache.set(cache_key, product, timeout=3600)
+        product = get_cached_product(product_id, cls._load_many)
+        if product is None:
+            raise cls.DoesNotExist(f'Product with id {product_id} not found')
         return product
-    
+
+    @classmethod
+    def get_many_cached(cls, product_ids):
+        """Return {id: product} for the IDs that exist, in one cache round-trip"""
+        return get_cached_products(product_ids, cls._load_many)
+
+    @classmethod
+    def invalidate_cached(cls, product_ids):
+        invalidate_products(product_ids)
+
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star, keyed 1 to 5"""
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+    @property
+    def review_summary(self):
+        return {
+            'count': self.review_count,
+            'average': self.avg_rating,
+            'histogram': self.rating_histogram
+        }
+
+    @classmethod
+    def apply_review_delta(cls, product_id, rating, delta):
+        """
+        Atomically add (delta=1) or remove (delta=-1) a review of the given
+        rating from the product's aggregates in a single UPDATE.
+        """
+        new_sum = F('rating_sum') + rating * delta
+        new_count = F('review_count') + delta
+        histogram_field = f'rating_{rating}_count'
+        # avg_rating is assigned first: MySQL evaluates SET clauses left to
+        # right against already-updated columns, other backends use the old row.
+        cls.objects.for_ids([product_id]).update(
+            avg_rating=Case(
+                When(review_count=-delta, then=Value(0.0)),
+                default=Cast(new_sum, FloatField()) / new_count,
+                output_field=FloatField(),
+            ),
+            rating_sum=new_sum,
+            review_count=new_count,
+            **{histogram_field: F(histogram_field) + delta},
+        )
+
     def __str__(self):
         return self.name
 
@@ -40,6 +197,10 @@ class Product(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=50)
     description = models.TextField(max_length=200)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized size of product_id, kept by adjust_product_counts and
+    # refresh_product_counts
+    product_count = models.PositiveIntegerField(default=0, editable=False)
     product_id = models.ManyToManyField(
         Product,
         related_name="categories"
@@ -47,6 +208,51 @@ class Category(models.Model):
     
     class Meta:
         db_table = 'category'
+
+    @classmethod
+    def refresh_product_counts(cls, category_ids=None):
+        """
+        Recount the products of the given categories (all when None) in a
+        single UPDATE and start a new category listing generation. Returns
+        the number of categories updated.
+        """
+        queryset = cls.objects.all()
+        if category_ids is not None:
+            category_ids = list(category_ids)
+            if not category_ids:
+                return 0
+            queryset = queryset.filter(id__in=category_ids)
+        counts = (
+            cls.product_id.through.objects
+            .filter(category_id=OuterRef('pk'))
+            .order_by()
+            .values('category_id')
+            .annotate(total=Count('*'))
+            .values('total')
+        )
+        updated = queryset.update(
+            product_count=Coalesce(Subquery(counts), 0),
+            updated_at=timezone.now()
+        )
+        bump_category_version()
+        return updated
+
+    @classmethod
+    def adjust_product_counts(cls, category_ids, delta):
+        """
+        Add delta to the product count of each of the given categories in one
+        UPDATE, without recounting their members, and start a new category
+        listing generation.
+        """
+        category_ids = list(category_ids)
+        if not category_ids or not delta:
+            return 0
+        updated = cls.objects.filter(id__in=category_ids).update(
+            product_count=F('product_count') + delta,
+            updated_at=timezone.now()
+        )
+        bump_category_version()
+        return updated
     
     
 
@@ -56,6 +262,8 @@ class Review(models.Model):
     rating = models.IntegerField(choices=RATING_CHOICES)
     comment = models.TextField(max_length=200)
     created_at = models.DateTimeField(auto_now=True)
+    # Never changes, unlike created_at which every edit moves; the feed sorts on it
+    posted_at = models.DateTimeField(auto_now_add=True)
     product_id = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
@@ -63,4 +271,42 @@ class Review(models.Model):
         )
 
     class Meta:
-        db_table = 'review'
\ No newline at end of file
+        db_table = 'review'
+        # Back the keyset-paginated review feed of a single product
+        indexes = [
+            models.Index(fields=['product_id', 'posted_at', 'id'], name='review_product_posted_idx'),
+            models.Index(fields=['product_id', 'rating', 'posted_at', 'id'], name='review_product_rating_post_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted rating so edits can adjust the aggregates
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+
+
+class RelatedProduct(models.Model):
+    """
+    Products most often bought together with product_id, best first. Rebuilt
+    in batch by the build_related_products command.
+    """
+    product_id = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="related_products"
+        )
+    related_id = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="+"
+        )
+    # Number of orders containing both products
+    score = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        db_table = 'related_product'
+        constraints = [
+            models.UniqueConstraint(fields=['product_id', 'rank'], name='related_product_rank_unique'),
+        ]
@@ -0,0 +1,144 @@
+# products/search.py
+"""
+Pluggable full-text search over product names and descriptions.
+
+The backend is picked from the ``PRODUCT_SEARCH_BACKEND`` setting (a dotted
+path) or, by default, from the database vendor: MySQL uses a FULLTEXT index,
+SQLite an FTS5 shadow table, anything else falls back to ``icontains``.
+Every backend annotates matching products with a ``relevance`` score.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(query):
+    """Split a search query into lower-cased word terms"""
+    return TOKEN_RE.findall(query.lower())
+
+
+class BaseSearchBackend:
+    # Product fields whose changes index() has to be told about
+    indexed_fields = frozenset()
+
+    def search(self, queryset, query):
+        """Filter queryset to products matching every term and annotate relevance"""
+        raise NotImplementedError
+
+    def index(self, product):
+        """Add or refresh a product in the search index"""
+
+    def index_many(self, products):
+        for product in products:
+            self.index(product)
+
+    def remove(self, product_id):
+        """Drop a product from the search index"""
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Substring matching for databases without a full-text engine"""
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+        condition = Q()
+        for term in terms:
+            condition &= Q(name__icontains=term) | Q(description__icontains=term)
+        return queryset.filter(condition).annotate(
+            relevance=Value(0.0, output_field=FloatField())
+        )
+
+
+class MySQLFulltextBackend(BaseSearchBackend):
+    """
+    Boolean-mode MATCH ... AGAINST over the product FULLTEXT index. The index
+    is maintained by InnoDB itself, so index() and remove() are no-ops.
+    """
+    match_sql = 'MATCH (product.name, product.description) AGAINST (%s IN BOOLEAN MODE)'
+
+    def build_query(self, terms):
+        return ' '.join(f'+{term}*' for term in terms)
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+        params = (self.build_query(terms),)
+        return queryset.filter(
+            RawSQL(self.match_sql, params, output_field=BooleanField())
+        ).annotate(
+            relevance=RawSQL(self.match_sql, params, output_field=FloatField())
+        )
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """FTS5 shadow table keyed by product id, ranked with bm25"""
+    table = 'product_fts'
+    indexed_fields = frozenset({'name', 'description'})
+
+    def build_query(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+        params = (self.build_query(terms),)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', params)
+        ).annotate(
+            # bm25() is lower-is-better; name matches weigh more than description
+            relevance=RawSQL(
+                f'SELECT -bm25({self.table}, 10.0, 1.0) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND rowid = product.id',
+                params,
+                output_field=FloatField()
+            )
+        )
+
+    def index(self, product):
+        self.index_many([product])
+
+    def index_many(self, products):
+        rows = [(product.id, product.name, product.description) for product in products]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)',
+                rows
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [product_id])
+
+
+VENDOR_BACKENDS = {
+    'mysql': MySQLFulltextBackend,
+    'sqlite': SQLiteFTS5Backend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured search backend instance"""
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+        if backend_path:
+            backend_class = import_string(backend_path)
+        else:
+            backend_class = VENDOR_BACKENDS.get(connection.vendor, SimpleSearchBackend)
+        _backend = backend_class()
+    return _backend
@@ -1,6 +1,21 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import Product, Category, Review
 
+
+class ImageVariantsField(serializers.Field):
+    """Storage paths of the image variants rendered as URLs"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return {
+            name: {extension: default_storage.url(path) for extension, path in formats.items()}
+            for name, formats in (value or {}).items()
+        }
+
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -8,26 +23,83 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 class CategorySerializer(serializers.ModelSerializer):
-    product_count = serializers.SerializerMethodField()
-
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'product_count']
-
-    def get_product_count(self, obj):
-        return obj.product_id.count()
+        read_only_fields = ['product_count']
 
 class ProductSerializer(serializers.ModelSerializer):
     reviews = ReviewSerializer(many=True, read_only=True)
     categories = CategorySerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(source='avg_rating', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    image_variants = ImageVariantsField()
     
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'image', 'categories', 'reviews', 'average_rating', 'stock']
+        fields = ['id', 'name', 'description', 'price', 'image', 'image_variants', 'categories', 'reviews', 'average_rating', 'review_count', 'rating_histogram', 'stock']
+        read_only_fields = ['review_count']
+
+
+class CategorySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name']
+
+
+class ProductListSerializer(serializers.ModelSerializer):
+    """
+    Lean product representation for list pages: categories come from a single
+    prefetch and reviews are summarized from the denormalized rating columns.
+    Pass ``fields`` to serialize only a subset of the fields.
+    """
+    categories = CategorySummarySerializer(many=True, read_only=True)
+    average_rating = serializers.FloatField(source='avg_rating', read_only=True)
+    review_summary = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
+
+    # Model columns each output field reads, used to trim the SELECT
+    field_columns = {
+        'id': ['id'],
+        'name': ['name'],
+        'description': ['description'],
+        'price': ['price'],
+        'image': ['image'],
+        'image_variants': ['image_variants'],
+        'categories': [],
+        'average_rating': ['avg_rating'],
+        'review_summary': [
+            'review_count', 'avg_rating',
+            'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+        ],
+        'stock': ['stock'],
+    }
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'description', 'price', 'image', 'image_variants', 'categories', 'average_rating', 'review_summary', 'stock']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def parse_fields(cls, value):
+        """Requested field names from a ?fields= value, or None for all fields"""
+        if not value:
+            return None
+        requested = [name.strip() for name in value.split(',')]
+        return [name for name in cls.Meta.fields if name in requested] or None
+
+    @classmethod
+    def columns_for(cls, fields):
+        """Model columns needed to serialize the given fields"""
+        columns = {'id'}
+        for name in fields or cls.Meta.fields:
+            columns.update(cls.field_columns[name])
+        return sorted(columns)
 
-    def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
\ No newline at end of file
+    def get_review_summary(self, obj):
+        return obj.review_summary
\ No newline at end of file
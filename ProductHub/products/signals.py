@@ -0,0 +1,131 @@
+# products/signals.py
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .caching import bump_catalog_version, bump_category_version, invalidate_products
+from .models import Category, Product, Review
+from .suggest import index_category, index_product, remove_category, remove_products
+
+
+def touch_products(product_ids):
+    """Bump updated_at (and drop cached copies) of products whose representation changed"""
+    if product_ids:
+        Product.objects.for_ids(list(product_ids)).update()
+
+
+def _deleted_with_product(origin):
+    """True when a review is removed as part of deleting its product"""
+    if isinstance(origin, Product):
+        return True
+    return isinstance(origin, QuerySet) and origin.model is Product
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    """Keep the product rating aggregates in step with review writes"""
+    if created:
+        Product.apply_review_delta(instance.product_id_id, instance.rating, 1)
+    else:
+        old_rating = getattr(instance, '_loaded_rating', None)
+        if old_rating is not None and old_rating != instance.rating:
+            Product.apply_review_delta(instance.product_id_id, old_rating, -1)
+            Product.apply_review_delta(instance.product_id_id, instance.rating, 1)
+        else:
+            # Comment edits still change the product detail representation
+            touch_products([instance.product_id_id])
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, origin=None, **kwargs):
+    """Remove a deleted review from its product's rating aggregates"""
+    if _deleted_with_product(origin):
+        return
+    Product.apply_review_delta(instance.product_id_id, instance.rating, -1)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # The category links are removed by cascade, without m2m_changed
+    instance._category_ids = list(instance.categories.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    Category.adjust_product_counts(instance.__dict__.pop('_category_ids', []), -1)
+    remove_products([instance.pk])
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    # The membership rows are removed by cascade, without m2m_changed
+    instance._product_ids = list(instance.product_id.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, signal, created=False, **kwargs):
+    """
+    Category names are part of every product list page and of the cached
+    cards of the category's products
+    """
+    bump_catalog_version()
+    bump_category_version()
+    if signal is post_delete:
+        remove_category(instance.pk)
+        # The remaining categories may all be older, so the products'
+        # own updated_at has to move for their validators to change
+        touch_products(instance.__dict__.pop('_product_ids', []))
+    else:
+        index_category(instance)
+        if not created:
+            invalidate_products(list(instance.product_id.values_list('id', flat=True)))
+
+
+@receiver(m2m_changed, sender=Category.product_id.through)
+def category_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Membership changes alter the products' categories and the categories'
+    product counts, so both sides are touched: the counts of the affected
+    categories are adjusted by the number of links added or removed (and
+    recounted after a clear) and the products' updated_at is bumped. This
+    also starts a new catalog generation for the filtered product lists.
+    """
+    if action == 'pre_clear':
+        related = instance.categories if reverse else instance.product_id
+        instance._cleared_ids = list(related.values_list('id', flat=True))
+        return
+    if action == 'pre_remove':
+        # pk_set holds every ID asked for, linked or not; keep the linked ones
+        if reverse:
+            links = sender.objects.filter(product_id=instance.pk, category_id__in=pk_set)
+            instance._removed_ids = set(links.values_list('category_id', flat=True))
+        else:
+            links = sender.objects.filter(category_id=instance.pk, product_id__in=pk_set)
+            instance._removed_ids = set(links.values_list('product_id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_ids', [])
+    elif action == 'post_remove':
+        pk_set = instance.__dict__.pop('_removed_ids', pk_set)
+    if reverse:
+        product_ids, category_ids = [instance.pk], pk_set
+    else:
+        product_ids, category_ids = pk_set, [instance.pk]
+
+    if action == 'post_clear':
+        Category.refresh_product_counts(category_ids)
+    elif pk_set:
+        # post_add only reports the links it created
+        change = 1 if reverse else len(pk_set)
+        Category.adjust_product_counts(category_ids, change if action == 'post_add' else -change)
+    touch_products(product_ids)
+    bump_catalog_version()
@@ -0,0 +1,334 @@
+"""
+Per-process prefix index for search-box autocomplete.
+
+Every word suffix of an active product or category name ("desk lamp" and
+"lamp" for "Desk Lamp") is kept in a sorted array, so the names matching a
+typed prefix form one contiguous slice found with two binary searches. For
+prefixes of up to ``SHORT_PREFIX`` characters, which can match most of the
+catalog, every match is also kept in rank order, so the best ones are the
+head of a list that writes update with a binary search; longer prefixes scan
+at most ``MAX_SCAN`` terms of their slice. Either way a lookup costs the
+same however many names match, and it never touches the database.
+
+The index is loaded in a background thread, on the first request of a
+process and again once it is older than ``PRODUCT_SUGGEST_MAX_AGE`` seconds
+to pick up writes made by other processes. Until the first load finishes,
+suggestions are read from the database instead. Writes in this process are
+applied by the product and category signals once their transaction commits,
+and writes made while a load runs are replayed onto its result.
+
+Products rank by average rating, then by number of reviews; categories by
+their product count.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+PRODUCT = 'product'
+CATEGORY = 'category'
+KINDS = (PRODUCT, CATEGORY)
+# The largest limit ProductSuggestView serves
+TOP_K = 25
+SHORT_PREFIX = 3
+MAX_SCAN = 2000
+# Sorts after every character a normalized term can contain
+HIGH = '\U0010ffff'
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def name_terms(name):
+    words = normalize(name).split(' ')
+    return {' '.join(words[index:]) for index in range(len(words)) if words[index]}
+
+
+def short_prefixes(terms):
+    return {term[:length] for term in terms for length in range(1, min(SHORT_PREFIX, len(term)) + 1)}
+
+
+def rank_key(score, obj_id):
+    """Sorts best first: highest score, then lowest ID"""
+    return (*(-value for value in score), obj_id)
+
+
+class PrefixIndex:
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self._terms = []  # sorted (term, kind, id)
+        self._entries = {}  # (kind, id) -> (name, score, terms)
+        self._ranked = {}  # (kind, short prefix) -> sorted rank keys of every match
+        self._journal = None  # writes made while a load runs
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    @property
+    def is_loaded(self):
+        return self._built_at is not None
+
+    @property
+    def is_tracking(self):
+        """Whether writes must be applied: the index is loaded or being loaded"""
+        return self._built_at is not None or self._journal is not None
+
+    def is_stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.max_age
+
+    def load(self, entries):
+        """Replace the whole index with (kind, id, name, score) entries"""
+        with self._lock:
+            self._journal = []
+        try:
+            records = {}
+            terms = []
+            ranked = {}
+            for kind, obj_id, name, score in entries:
+                keys = name_terms(name)
+                records[kind, obj_id] = (name, score, keys)
+                terms.extend((term, kind, obj_id) for term in keys)
+                key = rank_key(score, obj_id)
+                for prefix in short_prefixes(keys):
+                    ranked.setdefault((kind, prefix), []).append(key)
+            terms.sort()
+            for keys in ranked.values():
+                keys.sort()
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._terms = terms
+            self._entries = records
+            self._ranked = ranked
+            # The entries may have been read before these writes
+            for args in journal:
+                if len(args) == 4:
+                    self._add(*args)
+                else:
+                    self._remove(*args)
+            self._built_at = time.monotonic()
+
+    def _rank(self, kind, obj_id):
+        return rank_key(self._entries[kind, obj_id][1], obj_id)
+
+    def add(self, kind, obj_id, name, score):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((kind, obj_id, name, score))
+            self._add(kind, obj_id, name, score)
+
+    def remove(self, kind, obj_id):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((kind, obj_id))
+            self._remove(kind, obj_id)
+
+    def _add(self, kind, obj_id, name, score):
+        self._remove(kind, obj_id)
+        keys = name_terms(name)
+        self._entries[kind, obj_id] = (name, score, keys)
+        for term in keys:
+            bisect.insort(self._terms, (term, kind, obj_id))
+        key = rank_key(score, obj_id)
+        for prefix in short_prefixes(keys):
+            bisect.insort(self._ranked.setdefault((kind, prefix), []), key)
+
+    def _remove(self, kind, obj_id):
+        entry = self._entries.pop((kind, obj_id), None)
+        if entry is None:
+            return
+        _, score, keys = entry
+        for term in keys:
+            self._delete(self._terms, (term, kind, obj_id))
+        key = rank_key(score, obj_id)
+        for prefix in short_prefixes(keys):
+            ranked = self._ranked.get((kind, prefix))
+            if ranked is not None:
+                self._delete(ranked, key)
+                if not ranked:
+                    del self._ranked[kind, prefix]
+
+    @staticmethod
+    def _delete(items, item):
+        position = bisect.bisect_left(items, item)
+        if position < len(items) and items[position] == item:
+            del items[position]
+
+    def lookup(self, prefix, limit):
+        """
+        Top ``limit`` (at most TOP_K) products and categories whose name has a
+        word starting with prefix. Past SHORT_PREFIX characters only the first
+        MAX_SCAN matching terms are ranked, so a longer prefix matching more
+        than that returns good rather than the very best matches.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return {PRODUCT: [], CATEGORY: []}
+        with self._lock:
+            if len(prefix) <= SHORT_PREFIX:
+                best = {kind: [key[-1] for key in self._ranked.get((kind, prefix), [])[:limit]] for kind in KINDS}
+            else:
+                start = bisect.bisect_left(self._terms, (prefix,))
+                end = bisect.bisect_right(self._terms, (prefix + HIGH,), lo=start, hi=min(len(self._terms), start + MAX_SCAN))
+                matches = {PRODUCT: set(), CATEGORY: set()}
+                for _, kind, obj_id in self._terms[start:end]:
+                    matches[kind].add(obj_id)
+                best = {
+                    kind: heapq.nsmallest(limit, ids, key=lambda obj_id, kind=kind: self._rank(kind, obj_id))
+                    for kind, ids in matches.items()
+                }
+            return {
+                kind: [{'id': obj_id, 'name': self._entries[kind, obj_id][0]} for obj_id in ids]
+                for kind, ids in best.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._terms = []
+            self._entries = {}
+            self._ranked = {}
+            self._journal = None
+            self._built_at = None
+
+
+suggest_index = PrefixIndex(max_age=getattr(settings, 'PRODUCT_SUGGEST_MAX_AGE', 300))
+_reload_lock = threading.Lock()
+
+
+def product_score(product):
+    return (product.avg_rating, product.review_count)
+
+
+def load_suggest_index():
+    """Load every active product and every category into the index"""
+    from .models import Category, Product
+
+    def entries():
+        products = Product.objects.active().values_list('id', 'name', 'avg_rating', 'review_count')
+        for product_id, name, avg_rating, review_count in products.iterator(chunk_size=2000):
+            yield PRODUCT, product_id, name, (avg_rating, review_count)
+        for category_id, name, product_count in Category.objects.values_list('id', 'name', 'product_count'):
+            yield CATEGORY, category_id, name, (product_count,)
+
+    suggest_index.load(entries())
+
+
+def schedule_reload():
+    """Reload the index in a background thread, unless a reload is already running"""
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    thread = threading.Thread(target=_reload_in_worker, name='product-suggest-reload', daemon=True)
+    try:
+        thread.start()
+    except BaseException:
+        _reload_lock.release()
+        raise
+    return True
+
+
+def _reload_in_worker():
+    close_old_connections()
+    try:
+        load_suggest_index()
+    except Exception:
+        logger.exception('Loading the product suggest index failed')
+    finally:
+        close_old_connections()
+        _reload_lock.release()
+
+
+def suggest(prefix, limit):
+    if suggest_index.is_stale():
+        schedule_reload()
+    if not suggest_index.is_loaded:
+        return query_suggestions(prefix, limit)
+    return suggest_index.lookup(prefix, limit)
+
+
+def query_suggestions(prefix, limit):
+    """The same matches read from the database, while the index is not loaded yet"""
+    from .models import Category, Product
+
+    prefix = normalize(prefix)
+    if not prefix:
+        return {PRODUCT: [], CATEGORY: []}
+    limit = min(limit, TOP_K)
+    matches = Q(name__istartswith=prefix) | Q(name__icontains=f' {prefix}')
+    products = Product.objects.active().filter(matches).order_by('-avg_rating', '-review_count', 'id')
+    categories = Category.objects.filter(matches).order_by('-product_count', 'id')
+    return {
+        PRODUCT: list(products.values('id', 'name')[:limit]),
+        CATEGORY: list(categories.values('id', 'name')[:limit])
+    }
+
+
+def _on_commit(write):
+    """
+    Apply a write to the index once the current transaction commits, so a
+    rolled back one leaves nothing behind. A process that has not started
+    loading the index by then will read the row on load.
+    """
+    def apply():
+        if suggest_index.is_tracking:
+            write()
+    transaction.on_commit(apply)
+
+
+def index_product(product):
+    if product.is_active:
+        args = (PRODUCT, product.id, product.name, product_score(product))
+        _on_commit(lambda: suggest_index.add(*args))
+    else:
+        remove_products([product.id])
+
+
+def remove_products(product_ids):
+    product_ids = list(product_ids)
+
+    def write():
+        for product_id in product_ids:
+            suggest_index.remove(PRODUCT, product_id)
+    _on_commit(write)
+
+
+def refresh_products(product_ids):
+    """Re-read products changed by a bulk UPDATE, which sends no signals"""
+    if not product_ids:
+        return
+    from .models import Product
+
+    product_ids = list(product_ids)
+
+    def write():
+        products = Product.objects.filter(id__in=product_ids).only(
+            'id', 'name', 'is_active', 'avg_rating', 'review_count'
+        )
+        found = set()
+        for product in products:
+            found.add(product.id)
+            if product.is_active:
+                suggest_index.add(PRODUCT, product.id, product.name, product_score(product))
+            else:
+                suggest_index.remove(PRODUCT, product.id)
+        for product_id in set(product_ids) - found:
+            suggest_index.remove(PRODUCT, product_id)
+    _on_commit(write)
+
+
+def index_category(category):
+    args = (CATEGORY, category.id, category.name, (category.product_count,))
+    _on_commit(lambda: suggest_index.add(*args))
+
+
+def remove_category(category_id):
+    _on_commit(lambda: suggest_index.remove(CATEGORY, category_id))
@@ -3,9 +3,27 @@ from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.urls import reverse
+from django.core.management import call_command
+from django.db.models import F
+from django.core.cache import cache
 from products.models import Product, Category, Review
+from products.caching import local_product_cache
+from products import suggest as suggest_module
+from products.suggest import load_suggest_index, suggest_index
 from django.core.files.uploadedfile import SimpleUploadedFile
 import os
+import io
+import json
+import base64
+import shutil
+import tempfile
+from unittest.mock import PropertyMock, patch
+from django.db import DatabaseError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from products.images import VARIANT_DIR, generate_product_variants
+from products.importers import ProductImporter
+from PIL import Image
+from django.test import SimpleTestCase, override_settings
 from users.models import Customer, Admin
 
 User = get_user_model()
@@ -191,4 +209,1051 @@ class ProductTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['rating'], 4)
         self.assertEqual(response.data['comment'], 'Good laptop')
-        self.assertEqual(Review.objects.count(), 2)
\ No newline at end of file
+        self.assertEqual(Review.objects.count(), 2)
+
+    def test_review_updates_rating_aggregates(self):
+        """Test review writes keep the product rating aggregates in step"""
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('product-review', args=[self.laptop.id])
+        self.client.post(url, {'rating': 2, 'comment': 'Runs hot'}, format='json')
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.review_count, 2)
+        self.assertEqual(self.laptop.rating_sum, 7)
+        self.assertEqual(self.laptop.avg_rating, 3.5)
+        self.assertEqual(self.laptop.rating_histogram, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+
+        Review.objects.filter(product_id=self.laptop, rating=2).get().delete()
+        self.review.delete()
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.review_count, 0)
+        self.assertEqual(self.laptop.avg_rating, 0)
+        self.assertEqual(self.laptop.rating_5_count, 0)
+
+    def test_sort_products_by_rating(self):
+        """Test sorting by rating without a rating filter"""
+        Review.objects.create(rating=3, comment='Fine', product_id=self.poster)
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'sort': 'rating'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items'][0]['name'], 'Dell XPS 13')
+        self.assertEqual(response.data['items'][0]['average_rating'], 5.0)
+
+    def test_rebuild_rating_aggregates(self):
+        """Test the rebuild command restores drifted aggregates"""
+        Product.objects.filter(id=self.laptop.id).update(rating_sum=0, review_count=0, avg_rating=0)
+        call_command('rebuild_rating_aggregates', stdout=open(os.devnull, 'w'))
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.review_count, 1)
+        self.assertEqual(self.laptop.avg_rating, 5.0)
+        self.assertEqual(self.laptop.rating_5_count, 1)
+
+    def test_search_products_multi_term_prefix(self):
+        """Test every term must match and the last term matches as a prefix"""
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'search': 'dell lap'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 1)
+        self.assertEqual(response.data['items'][0]['name'], 'Dell XPS 13')
+
+        response = self.client.get(url, {'search': 'dell poster'})
+        self.assertEqual(len(response.data['items']), 0)
+
+    def test_search_products_by_relevance(self):
+        """Test relevance ranks name matches above description matches"""
+        Product.objects.create(
+            name='Laptop stand',
+            description='Aluminium stand',
+            price=30.0,
+            image='uploads/products/stand.jpg'
+        )
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'search': 'laptop', 'sort': 'relevance'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items'][0]['name'], 'Laptop stand')
+
+    def test_search_index_follows_product_changes(self):
+        """Test renamed and deleted products are reflected in search"""
+        url = reverse('product-list-create')
+        self.poster.name = 'Gatsby Print'
+        self.poster.save()
+        response = self.client.get(url, {'search': 'print'})
+        self.assertEqual(len(response.data['items']), 1)
+
+        self.poster.delete()
+        response = self.client.get(url, {'search': 'gatsby'})
+        self.assertEqual(len(response.data['items']), 0)
+
+    def test_search_index_follows_bulk_updates(self):
+        """Test queryset updates of indexed text are searchable"""
+        url = reverse('product-list-create')
+        Product.objects.filter(id=self.poster.id).update(name='Lithograph', description='Stone print')
+        self.assertEqual(len(self.client.get(url, {'search': 'lithograph'}).data['items']), 1)
+        self.assertEqual(len(self.client.get(url, {'search': 'stone'}).data['items']), 1)
+
+    def test_cursor_pagination_follows_sort(self):
+        """Test cursor pages walk a sort in order without counting"""
+        for index in range(3):
+            Product.objects.create(
+                name=f'Cable {index}',
+                description='USB cable',
+                price=20.0,
+                image='uploads/products/cable.jpg'
+            )
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'pagination': 'cursor', 'sort': 'price_desc', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('total_items', response.data)
+        self.assertIsNone(response.data['links']['previous'])
+
+        names = [item['name'] for item in response.data['items']]
+        while response.data['links']['next']:
+            response = self.client.get(response.data['links']['next'])
+            names.extend(item['name'] for item in response.data['items'])
+        self.assertEqual(len(names), 5)
+        self.assertEqual(len(set(names)), 5)
+        self.assertEqual(names[0], 'Dell XPS 13')
+
+        response = self.client.get(response.data['links']['previous'])
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertEqual(response.data['items'][-1]['name'], names[-2])
+
+    def test_invalid_cursor(self):
+        """Test a tampered cursor is rejected"""
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        crafted = [
+            {'v': [], 'id': 'x'},
+            {'v': ['x']},
+            {'v': [[1]]},
+            {'v': [None]},
+            {'v': [1], 'r': 'yes'},
+            ['v'],
+        ]
+        for position in crafted:
+            cursor = base64.b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+        cursor = base64.b64encode(json.dumps({'v': ['abc', 1]}).encode('utf-8')).decode('ascii')
+        response = self.client.get(url, {'sort': 'price_asc', 'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_product_list_representation(self):
+        """Test the list returns category stubs and a review summary"""
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'sort': 'price_desc'})
+        laptop = response.data['items'][0]
+        self.assertNotIn('reviews', laptop)
+        self.assertEqual(laptop['categories'], [{'id': self.electronics.id, 'name': 'Electronics'}])
+        self.assertEqual(laptop['review_summary']['count'], 1)
+        # Cards hold the encoded JSON, whose object keys are strings
+        self.assertEqual(laptop['review_summary']['histogram']['5'], 1)
+
+    def test_product_list_sparse_fields(self):
+        """Test ?fields= limits the serialized fields"""
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'fields': 'id,name,price'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['items'][0]), {'id', 'name', 'price'})
+
+    def test_product_list_query_count_is_constant(self):
+        """Test a page costs the same number of queries for any page size"""
+        for index in range(10):
+            product = Product.objects.create(
+                name=f'Mouse {index}',
+                description='Wireless mouse',
+                price=15.0,
+                image='uploads/products/mouse.jpg'
+            )
+            product.categories.add(self.electronics, self.artwork)
+            Review.objects.create(rating=4, comment='Nice', product_id=product)
+        url = reverse('product-list-create')
+        # COUNT, page of IDs, then the products without a cached card and
+        # one categories prefetch
+        for page_size in (2, 12):
+            with self.assertNumQueries(4):
+                response = self.client.get(url, {'page_size': page_size})
+            self.assertEqual(len(response.data['items']), page_size)
+
+        # Once every card is cached only COUNT and the page of IDs remain
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'page_size': 12, 'sort': 'name_asc'})
+        self.assertEqual(len(response.data['items']), 12)
+
+    def test_product_list_is_cached_until_catalog_changes(self):
+        """Test identical list requests hit the cache until a catalog write"""
+        url = reverse('product-list-create')
+        params = {'sort': 'price_asc', 'min_price': 1}
+        self.assertEqual(self.client.get(url, params)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'min_price': 1, 'sort': 'price_asc', 'search': ''})
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        self.poster.categories.set([self.electronics])
+        self.assertEqual(self.client.get(url, params)['X-Cache'], 'MISS')
+        Review.objects.create(rating=1, comment='Faded', product_id=self.poster)
+        response = self.client.get(url, params)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['items'][0]['review_summary']['count'], 1)
+        self.laptop.price = 10.0
+        self.laptop.save()
+        response = self.client.get(url, params)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['items'][0]['name'], 'Dell XPS 13')
+
+    def test_product_list_cache_stats(self):
+        """Test admins can read the list cache counters"""
+        url = reverse('product-list-create')
+        self.client.get(url)
+        self.client.get(url)
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(reverse('product-list-cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.data['hits'], 1)
+        self.assertGreaterEqual(response.data['misses'], 1)
+
+
+class ProductCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_product_cache.clear()
+        self.products = [
+            Product.objects.create(
+                name=f'Product_{index}',
+                description='Test Product',
+                price=10.0,
+                stock=5
+            )
+            for index in range(3)
+        ]
+
+    def test_get_many_cached_uses_one_query(self):
+        """Test a bulk lookup loads every missing product in one query"""
+        ids = [product.id for product in self.products]
+        with self.assertNumQueries(1):
+            products = Product.get_many_cached(ids + [999999])
+        self.assertEqual(set(products), set(ids))
+        with self.assertNumQueries(0):
+            products = Product.get_many_cached(ids + [999999])
+        self.assertEqual(len(products), 3)
+
+    def test_get_cached_negative_caching(self):
+        """Test a missing ID is not looked up again"""
+        with self.assertNumQueries(1):
+            with self.assertRaises(Product.DoesNotExist):
+                Product.get_cached(999999)
+        with self.assertNumQueries(0):
+            with self.assertRaises(Product.DoesNotExist):
+                Product.get_cached(999999)
+
+    def test_bulk_update_invalidates_cache(self):
+        """Test queryset updates and deletes drop stale cached products"""
+        product = self.products[0]
+        self.assertEqual(Product.get_cached(product.id).stock, 5)
+        Product.objects.filter(id=product.id).update(stock=F('stock') - 2)
+        self.assertEqual(Product.get_cached(product.id).stock, 3)
+        Product.objects.filter(id=product.id).delete()
+        with self.assertRaises(Product.DoesNotExist):
+            Product.get_cached(product.id)
+
+    def test_wide_update_skips_id_lookup(self):
+        """Test an update not limited by ID runs one query and still drops cached products"""
+        ids = [product.id for product in self.products]
+        self.assertEqual(Product.get_cached(ids[0]).stock, 5)
+        with self.assertNumQueries(1):
+            Product.objects.filter(stock__gte=5).update(stock=F('stock') + 1)
+        self.assertEqual(Product.get_cached(ids[0]).stock, 6)
+        self.assertEqual({product.stock for product in Product.get_many_cached(ids).values()}, {6})
+
+    def test_local_cache_returns_copies(self):
+        """Test changing a cached product does not leak into later reads"""
+        product = self.products[0]
+        Product.get_cached(product.id).stock = 0
+        self.assertEqual(Product.get_cached(product.id).stock, 5)
+
+
+class ProductFacetTests(APITestCase):
+    def setUp(self):
+        self.electronics = Category.objects.create(name='Electronics', description='Electronic devices')
+        self.audio = Category.objects.create(name='Audio', description='Audio devices')
+        prices = [10, 45, 60, 120]
+        self.products = []
+        for index, price in enumerate(prices):
+            product = Product.objects.create(
+                name=f'Speaker {index}',
+                description='Bluetooth speaker',
+                price=price,
+                image='uploads/products/speaker.jpg'
+            )
+            product.categories.add(self.electronics)
+            if price < 100:
+                product.categories.add(self.audio)
+            self.products.append(product)
+
+    def test_category_and_price_facets(self):
+        """Test facets count the filtered products per category and price bucket"""
+        url = reverse('product-list-create')
+        # one grouped query per facet on top of the list queries: COUNT,
+        # page of IDs, then the uncached cards' products and categories
+        with self.assertNumQueries(6):
+            response = self.client.get(url, {'facets': 'categories,price', 'min_price': 20})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        facets = response.data['facets']
+        self.assertEqual(facets['categories'], [
+            {'id': self.electronics.id, 'name': 'Electronics', 'count': 3},
+            {'id': self.audio.id, 'name': 'Audio', 'count': 2},
+        ])
+        self.assertEqual(facets['price'], [
+            {'min': '0', 'max': '50', 'count': 1},
+            {'min': '50', 'max': '100', 'count': 1},
+            {'min': '100', 'max': '150', 'count': 1},
+        ])
+
+    def test_price_facet_interval(self):
+        """Test the price histogram bucket width is configurable"""
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'facets': 'price', 'price_interval': 100, 'category': self.audio.id})
+        self.assertEqual(response.data['facets']['price'], [{'min': '0', 'max': '100', 'count': 3}])
+        self.assertNotIn('categories', response.data['facets'])
+
+        response = self.client.get(url, {'facets': 'price', 'price_interval': -5})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+
+@override_settings(PRODUCT_IMAGE_VARIANTS_ASYNC=False)
+class ProductImageTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.admin_user = User.objects.create_user(
+            username='imageadmin',
+            password='testadminpassword',
+            is_admin=True
+        )
+        self.client.force_authenticate(user=self.admin_user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def make_upload(self, name='photo.jpg', size=(1600, 900)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color=(200, 30, 30)).save(buffer, format='JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def create_product(self, image):
+        data = {
+            'name': 'Camera',
+            'description': 'Mirrorless camera',
+            'price': 800.0,
+            'image': image
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('product-list-create'), data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Product.objects.get(id=response.data['id'])
+
+    def test_upload_generates_deduplicated_variants(self):
+        """Test uploads get resized WebP/JPEG variants shared by identical images"""
+        product = self.create_product(self.make_upload())
+        self.assertEqual(set(product.image_variants), {'thumbnail', 'card', 'detail'})
+        thumbnail = product.image_variants['thumbnail']['webp']
+        with Image.open(os.path.join(self.media_root, thumbnail)) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertLessEqual(max(image.size), 150)
+
+        duplicate = self.create_product(self.make_upload(name='copy.jpg'))
+        self.assertEqual(duplicate.image_variants, product.image_variants)
+
+        response = self.client.get(reverse('product-list-create'), {'fields': 'id,image_variants'})
+        self.assertTrue(response.data['items'][0]['image_variants']['card']['jpeg'].endswith('.jpeg'))
+
+    def test_replacing_image_rebuilds_variants(self):
+        """Test a new image drops the old variants and builds its own"""
+        product = self.create_product(self.make_upload())
+        old_variants = product.image_variants
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 800), color=(30, 30, 200)).save(buffer, format='PNG')
+        upload = SimpleUploadedFile('new.png', buffer.getvalue(), content_type='image/png')
+        url = reverse('product-detail', kwargs={'pk': product.id})
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.put(url, {'image': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+        for callback in callbacks:
+            callback()
+        product.refresh_from_db()
+        self.assertEqual(set(product.image_variants), {'thumbnail', 'card', 'detail'})
+        self.assertNotEqual(product.image_variants, old_variants)
+
+    def test_decompression_bomb_is_skipped(self):
+        """Test images over Pillow's pixel limit are rejected on upload and skipped by the generator"""
+        product = self.create_product(self.make_upload())
+        Product.objects.for_ids([product.id]).update(image_variants={})
+        shutil.rmtree(os.path.join(self.media_root, VARIANT_DIR))
+        with patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            data = {'name': 'Huge', 'description': 'Huge', 'price': 5.0, 'image': self.make_upload()}
+            response = self.client.post(reverse('product-list-create'), data, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            with self.assertLogs('products.images', 'WARNING'):
+                self.assertIsNone(generate_product_variants(product.id))
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+
+    def test_upload_rejects_disguised_file(self):
+        """Test a non-image with an image extension is rejected"""
+        upload = SimpleUploadedFile('fake.jpg', b'not really a jpeg', content_type='image/jpeg')
+        data = {'name': 'Fake', 'description': 'Fake', 'price': 5.0, 'image': upload}
+        response = self.client.post(reverse('product-list-create'), data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Product.objects.count(), 0)
+
+
+class ProductImportTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            username='importadmin',
+            password='testadminpassword',
+            is_admin=True
+        )
+        self.electronics = Category.objects.create(name='Electronics', description='Electronic devices')
+        self.audio = Category.objects.create(name='Audio', description='Audio devices')
+
+    def test_import_csv_reports_row_errors(self):
+        """Test a CSV import creates valid rows and reports bad ones"""
+        content = (
+            'name,description,price,stock,categories\n'
+            f'Headphones,Over-ear headphones,99.99,5,{self.electronics.id}|{self.audio.id}\n'
+            'Broken,Negative price,-1,5,\n'
+            f'Earbuds,In-ear buds,49.00,,{self.audio.id}\n'
+            'Ghost,Unknown category,10,1,999999\n'
+        )
+        upload = SimpleUploadedFile('products.csv', content.encode('utf-8'), content_type='text/csv')
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(reverse('product-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rows'], 4)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 5])
+
+        headphones = Product.objects.get(name='Headphones')
+        self.assertEqual(headphones.stock, 5)
+        self.assertEqual(set(headphones.categories.values_list('id', flat=True)), {self.electronics.id, self.audio.id})
+        self.assertEqual(Product.objects.get(name='Earbuds').stock, 0)
+
+        response = self.client.get(reverse('product-list-create'), {'search': 'earbuds'})
+        self.assertEqual(len(response.data['items']), 1)
+
+    def test_import_rejects_non_utf8_file(self):
+        """Test a file that is not UTF-8 is a bad request, not a server error"""
+        content = 'name,description,price\nCaf\xe9,Espresso machine,120.00\n'.encode('latin-1')
+        upload = SimpleUploadedFile('products.csv', content, content_type='text/csv')
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(reverse('product-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Product.objects.count(), 0)
+
+    def test_import_jsonl_command_batches(self):
+        """Test the command imports JSON Lines in batches and skips bad lines"""
+        lines = [
+            json.dumps({'name': f'Cable {index}', 'description': 'USB cable', 'price': '5.00', 'categories': [self.electronics.id]})
+            for index in range(10)
+        ]
+        path = os.path.join(tempfile.mkdtemp(), 'products.jsonl')
+        with open(path, 'w') as stream:
+            stream.write('\n'.join(lines + ['not json']))
+        call_command('import_products', path, '--batch-size', '5', stdout=io.StringIO(), stderr=io.StringIO())
+        shutil.rmtree(os.path.dirname(path))
+        self.assertEqual(Product.objects.filter(name__startswith='Cable').count(), 10)
+        self.assertEqual(self.electronics.product_id.count(), 10)
+        self.electronics.refresh_from_db()
+        self.assertEqual(self.electronics.product_count, 10)
+
+
+    def test_import_reads_back_ids_by_placeholder(self):
+        """Test backends without RETURNING map IDs by a placeholder, not by the real name"""
+        bulk_create = Product.objects.bulk_create
+
+        def concurrent_insert(objs, *args, **kwargs):
+            # Another client inserts a product with the same name meanwhile
+            Product.objects.create(name='Speaker', description='Someone else', price=1.0)
+            created = bulk_create(objs, *args, **kwargs)
+            Product.objects.create(name='Speaker', description='Someone else', price=1.0)
+            return created
+
+        content = f'name,description,price,categories\nSpeaker,Bookshelf speaker,80.00,{self.audio.id}\n'
+        features = type(connection.features)
+        with patch.object(features, 'can_return_rows_from_bulk_insert', new_callable=PropertyMock, return_value=False):
+            with patch.object(Product.objects, 'bulk_create', side_effect=concurrent_insert):
+                report = ProductImporter().run(io.BytesIO(content.encode('utf-8')), 'csv')
+        self.assertEqual(report.created, 1)
+        self.assertEqual(
+            list(self.audio.product_id.values_list('description', flat=True)),
+            ['Bookshelf speaker']
+        )
+        self.assertEqual(Product.objects.filter(name='Speaker').count(), 3)
+
+class ProductBulkUpdateTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            username='bulkadmin',
+            password='testadminpassword',
+            is_admin=True
+        )
+        self.products = [
+            Product.objects.create(name=f'Item {index}', description='Item', price=10.0, stock=1)
+            for index in range(4)
+        ]
+
+    def test_bulk_update_reports_per_id_outcomes(self):
+        """Test bulk updates apply set-based changes and report every entry"""
+        first, second, third, _ = self.products
+        cached = Product.get_cached(first.id)
+        self.assertEqual(cached.stock, 1)
+        updates = [
+            {'id': first.id, 'price': '12.50', 'stock': 40},
+            {'id': second.id, 'is_active': False},
+            {'id': third.id, 'stock': -3},
+            {'id': 999999, 'price': 5},
+            {'id': first.id, 'stock': 1},
+        ]
+        self.client.force_authenticate(user=self.admin_user)
+        # savepoint, lookup, update and its release
+        with self.assertNumQueries(4):
+            response = self.client.patch(reverse('product-bulk-update'), {'updates': updates}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['updated'], response.data['not_found'], response.data['invalid']), (2, 1, 2))
+        outcomes = {(result['id'], result['status']) for result in response.data['results']}
+        self.assertIn((third.id, 'invalid'), outcomes)
+        self.assertIn((999999, 'not_found'), outcomes)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((str(first.price), first.stock, first.is_active), ('12.50', 40, True))
+        self.assertEqual((str(second.price), second.stock, second.is_active), ('10.00', 1, False))
+        self.assertEqual(Product.get_cached(first.id).stock, 40)
+
+    def test_bulk_update_rejects_malformed_input(self):
+        """Test non-integer ids are invalid entries and non-object bodies are bad requests"""
+        first = self.products[0]
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse('product-bulk-update')
+        updates = [{'id': True, 'stock': 9}, {'id': str(first.id), 'stock': 9}, {'id': first.id + 0.5, 'stock': 9}]
+        response = self.client.patch(url, {'updates': updates}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['invalid'], 3)
+        first.refresh_from_db()
+        self.assertEqual(first.stock, 1)
+        for body in ([{'id': first.id, 'stock': 9}], 5):
+            response = self.client.patch(url, body, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update_requires_admin(self):
+        """Test customers cannot bulk update products"""
+        customer = User.objects.create_user(username='bulkcustomer', password='testpassword', is_customer=True)
+        self.client.force_authenticate(user=customer)
+        response = self.client.patch(reverse('product-bulk-update'), {'updates': [{'id': 1, 'stock': 2}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='poller', password='testpassword', is_customer=True)
+        Customer.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Garden', description='Garden tools')
+        self.product = Product.objects.create(name='Rake', description='Steel rake', price=15.0)
+        self.product.categories.add(self.category)
+
+    def test_product_detail_not_modified(self):
+        """Test a matching If-None-Match short-circuits to 304 in one query"""
+        url = reverse('product-detail', args=[self.product.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_product_etag_follows_related_changes(self):
+        """Test reviews, stock updates and category renames change the ETag"""
+        url = reverse('product-detail', args=[self.product.id])
+        etags = [self.client.get(url)['ETag']]
+        Review.objects.create(rating=4, comment='Sturdy', product_id=self.product)
+        etags.append(self.client.get(url)['ETag'])
+        Product.objects.filter(id=self.product.id).update(stock=3)
+        etags.append(self.client.get(url)['ETag'])
+        self.category.name = 'Outdoor'
+        self.category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[-1])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etags.append(response['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_product_etag_changes_when_a_category_is_deleted(self):
+        """Test deleting an older category still changes the product ETag"""
+        newer = Category.objects.create(name='Tools', description='Hand tools')
+        self.product.categories.add(newer)
+        url = reverse('product-detail', args=[self.product.id])
+        etag = self.client.get(url)['ETag']
+        self.category.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([category['name'] for category in response.data['categories']], ['Tools'])
+
+    def test_category_list_not_modified(self):
+        """Test the category list ETag changes with membership"""
+        url = reverse('category-list-create')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        other = Product.objects.create(name='Hoe', description='Garden hoe', price=12.0)
+        self.category.product_id.add(other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items'][0]['product_count'], 2)
+        self.assertNotEqual(self.client.get(url, {'page': 1})['ETag'], response['ETag'])
+
+
+class CategoryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='browser', password='testpassword', is_customer=True)
+        Customer.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.tools = Category.objects.create(name='Tools', description='Hand tools')
+        self.paint = Category.objects.create(name='Paint', description='Paint and brushes')
+        self.hammer = Product.objects.create(name='Hammer', description='Claw hammer', price=20.0)
+        self.brush = Product.objects.create(name='Brush', description='Paint brush', price=5.0)
+
+    def counts(self):
+        return dict(Category.objects.values_list('name', 'product_count'))
+
+    def test_membership_changes_update_counts(self):
+        """Test add, remove and clear from either side keep product_count exact"""
+        self.tools.product_id.add(self.hammer, self.brush)
+        self.brush.categories.add(self.paint)
+        self.assertEqual(self.counts(), {'Tools': 2, 'Paint': 1})
+
+        self.tools.product_id.remove(self.brush)
+        self.assertEqual(self.counts(), {'Tools': 1, 'Paint': 1})
+
+        self.brush.categories.clear()
+        self.assertEqual(self.counts(), {'Tools': 1, 'Paint': 0})
+
+        self.tools.product_id.clear()
+        self.assertEqual(self.counts(), {'Tools': 0, 'Paint': 0})
+
+    def test_counts_are_adjusted_without_recounting(self):
+        """Test adds and removes apply deltas of the links actually changed"""
+        self.tools.product_id.add(self.hammer)
+        with CaptureQueriesContext(connection) as queries:
+            self.tools.product_id.add(self.hammer, self.brush)
+            self.paint.product_id.remove(self.hammer)
+            self.brush.categories.remove(self.tools, self.paint)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self.counts(), {'Tools': 1, 'Paint': 0})
+
+    def test_product_delete_updates_counts(self):
+        """Test deleting a product decrements its categories"""
+        self.hammer.categories.add(self.tools, self.paint)
+        self.brush.categories.add(self.paint)
+        self.hammer.delete()
+        self.assertEqual(self.counts(), {'Tools': 0, 'Paint': 1})
+
+    def test_reconcile_command_fixes_drift(self):
+        """Test the reconciliation command only rewrites drifted categories"""
+        self.tools.product_id.add(self.hammer)
+        Category.objects.filter(id=self.tools.id).update(product_count=7)
+        untouched = Category.objects.get(id=self.paint.id).updated_at
+
+        out = io.StringIO()
+        call_command('reconcile_category_counts', '--dry-run', stdout=out)
+        self.assertIn('Found 1 drifted', out.getvalue())
+        self.assertEqual(self.counts()['Tools'], 7)
+
+        call_command('reconcile_category_counts', stdout=io.StringIO())
+        self.assertEqual(self.counts(), {'Tools': 1, 'Paint': 0})
+        self.assertEqual(Category.objects.get(id=self.paint.id).updated_at, untouched)
+
+    def test_category_list_cached_until_membership_changes(self):
+        """Test cache hits cost no query and only category writes invalidate them"""
+        url = reverse('category-list-create')
+        self.tools.product_id.add(self.hammer)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['items'][0]['product_count'], 1)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Product writes that leave membership alone keep the listing warm
+        Product.objects.filter(id=self.hammer.id).update(price=25.0)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        self.tools.product_id.add(self.brush)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['items'][0]['product_count'], 2)
+
+        self.paint.name = 'Paints'
+        self.paint.save()
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+
+class ReviewFeedTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='testpassword', is_customer=True)
+        Customer.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(name='Kettle', description='Electric kettle', price=30.0)
+        self.reviews = [
+            Review.objects.create(rating=rating, comment=f'Review {index}', product_id=self.product)
+            for index, rating in enumerate([5, 3, 4, 5, 1, 2, 5])
+        ]
+        self.url = reverse('product-review', args=[self.product.id])
+
+    def collect(self, params):
+        """Follow next links to the end, returning review IDs and the page count"""
+        ids, pages = [], 0
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(review['id'] for review in response.data['items'])
+            pages += 1
+            if not response.data['links']['next']:
+                return ids, pages
+            response = self.client.get(response.data['links']['next'])
+
+    def test_newest_first_feed(self):
+        """Test the default feed pages newest first without gaps or repeats"""
+        ids, pages = self.collect({'page_size': 3})
+        self.assertEqual(ids, [review.id for review in reversed(self.reviews)])
+        self.assertEqual(pages, 3)
+
+    def test_rating_sorted_feed(self):
+        """Test sorting by rating with the newest review first on ties"""
+        ids, _ = self.collect({'page_size': 2, 'sort': 'rating_desc'})
+        expected = sorted(self.reviews, key=lambda review: (-review.rating, -review.posted_at.timestamp(), -review.id))
+        self.assertEqual(ids, [review.id for review in expected])
+
+    def test_edited_review_keeps_its_place(self):
+        """Test editing a review does not move it to the top of the feed"""
+        oldest = self.reviews[0]
+        oldest.comment = 'Edited'
+        oldest.save()
+        ids, _ = self.collect({'page_size': 3})
+        self.assertEqual(ids[-1], oldest.id)
+
+    def test_review_summary_from_product_columns(self):
+        """Test the histogram is read from the product without counting reviews"""
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(response.data['review_summary'], {
+            'count': 7,
+            'average': 25 / 7,
+            'histogram': {1: 1, 2: 1, 3: 1, 4: 1, 5: 3}
+        })
+        self.assertNotIn('total_items', response.data)
+
+    def test_reviews_of_missing_product(self):
+        """Test the feed of an unknown product is a 404"""
+        response = self.client.get(reverse('product-review', args=[self.product.id + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ActiveCatalogTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_user(username='catalogadmin', password='testadminpassword', is_admin=True)
+        Admin.objects.create(user=self.admin_user)
+        self.customer_user = User.objects.create_user(username='shopper', password='testpassword', is_customer=True)
+        Customer.objects.create(user=self.customer_user)
+        self.lamp = Product.objects.create(name='Lamp', description='Desk lamp', price=25.0)
+        self.retired = Product.objects.create(name='Lantern', description='Oil lantern', price=40.0, is_active=False)
+
+    def names(self, response):
+        return [item['name'] for item in response.data['items']]
+
+    def test_public_list_excludes_inactive(self):
+        """Test inactive products are left out of listing, counts and search"""
+        response = self.client.get(reverse('product-list-create'), {'facets': 'price'})
+        self.assertEqual(self.names(response), ['Lamp'])
+        self.assertEqual(response.data['total_items'], 1)
+        self.assertEqual(sum(bucket['count'] for bucket in response.data['facets']['price']), 1)
+
+        response = self.client.get(reverse('product-list-create'), {'search': 'lantern'})
+        self.assertEqual(self.names(response), [])
+
+    def test_admin_list_includes_inactive(self):
+        """Test admins see inactive products and can filter on them"""
+        url = reverse('product-admin-list')
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(url, {'sort': 'name_asc'})
+        self.assertEqual(self.names(response), ['Lamp', 'Lantern'])
+        response = self.client.get(url, {'is_active': 'false'})
+        self.assertEqual(self.names(response), ['Lantern'])
+
+        # The admin listing is cached separately from the public one
+        response = self.client.get(reverse('product-list-create'), {'sort': 'name_asc'})
+        self.assertEqual(self.names(response), ['Lamp'])
+
+    def test_admin_list_requires_admin(self):
+        """Test customers cannot read the admin listing"""
+        self.client.force_authenticate(user=self.customer_user)
+        response = self.client.get(reverse('product-admin-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProductSuggestTests(APITestCase):
+    def setUp(self):
+        suggest_index.clear()
+        self.url = reverse('product-suggest')
+        self.lamp = Product.objects.create(name='Desk Lamp', description='LED lamp', price=25.0)
+        self.lantern = Product.objects.create(name='Lantern', description='Camping lantern', price=40.0)
+        self.laptop = Product.objects.create(name='Laptop', description='Notebook', price=900.0, is_active=False)
+        self.lighting = Category.objects.create(name='Lighting', description='Lamps and lights')
+        Review.objects.create(rating=5, comment='Bright', product_id=self.lantern)
+        Review.objects.create(rating=3, comment='Fine', product_id=self.lamp)
+        load_suggest_index()
+
+    def names(self, response, kind='products'):
+        return [item['name'] for item in response.data[kind]]
+
+    def test_prefix_matches_ranked_by_rating(self):
+        """Test any word of a name matches, best rated first, inactive left out"""
+        response = self.client.get(self.url, {'q': 'La'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.names(response), ['Lantern', 'Desk Lamp'])
+        response = self.client.get(self.url, {'q': 'LIGHT'})
+        self.assertEqual(self.names(response, 'categories'), ['Lighting'])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'la', 'limit': 1})), ['Lantern'])
+
+    def test_lookups_do_not_query_once_loaded(self):
+        """Test lookups are answered from memory"""
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'desk'})
+        self.assertEqual(self.names(response), ['Desk Lamp'])
+
+    def test_unloaded_index_reloads_in_the_background(self):
+        """Test a cold index is reloaded off the request path, once, and the database answers meanwhile"""
+        suggest_index.clear()
+        with patch.object(suggest_module.threading, 'Thread') as thread:
+            with self.assertNumQueries(2):
+                response = self.client.get(self.url, {'q': 'la'})
+            self.client.get(self.url, {'q': 'la'})
+        self.assertEqual(self.names(response), ['Lantern', 'Desk Lamp'])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'light'}), 'categories'), ['Lighting'])
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        suggest_module._reload_lock.release()
+
+    def test_writes_during_a_load_are_kept(self):
+        """Test a save made while the index loads is replayed onto the loaded index"""
+        suggest_index.clear()
+        rows = [('product', self.lamp.id, 'Desk Lamp', (3.0, 1))]
+
+        def entries():
+            yield from rows
+            # Saved after the load read its rows
+            with self.captureOnCommitCallbacks(execute=True):
+                self.lamp.name = 'Table Lamp'
+                self.lamp.save()
+
+        suggest_index.load(entries())
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'table'})), ['Table Lamp'])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'desk'})), [])
+
+    def test_short_prefix_lists_follow_ratings(self):
+        """Test precomputed short prefix rankings follow new reviews and removals"""
+        with self.captureOnCommitCallbacks(execute=True):
+            extra = [
+                Product.objects.create(name=f'Lamp {index}', description='Lamp', price=10.0)
+                for index in range(suggest_module.TOP_K + 5)
+            ]
+        response = self.client.get(self.url, {'q': 'l', 'limit': 25})
+        self.assertEqual(len(response.data['products']), 25)
+        self.assertEqual(self.names(response)[0], 'Lantern')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(rating=5, comment='Great', product_id=extra[-1])
+            Review.objects.create(rating=5, comment='Great', product_id=extra[-1])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'l', 'limit': 1})), [extra[-1].name])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'lamp 1', 'limit': 1})), [extra[1].name])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lantern.delete()
+            extra[-1].delete()
+        response = self.client.get(self.url, {'q': 'l', 'limit': 25})
+        self.assertEqual(len(response.data['products']), 25)
+        self.assertEqual(self.names(response)[0], 'Desk Lamp')
+
+    def test_index_follows_product_writes(self):
+        """Test saves, bulk updates and deletes update the loaded index"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Lava Lamp', description='Retro lamp', price=30.0)
+            self.lamp.name = 'Reading Light'
+            self.lamp.save()
+            Product.objects.filter(id=self.laptop.id).update(is_active=True)
+            self.lantern.delete()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'la'})
+        self.assertEqual(sorted(self.names(response)), ['Laptop', 'Lava Lamp'])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'light'})), ['Reading Light'])
+
+    def test_rolled_back_writes_are_not_indexed(self):
+        """Test a save in a transaction that rolls back leaves no suggestion behind"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    Product.objects.create(name='Phantom Lamp', description='Never committed', price=5.0)
+                    raise DatabaseError('rolled back')
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'phantom'})), [])
+
+    def test_invalid_limit(self):
+        """Test a non-numeric limit is rejected"""
+        response = self.client.get(self.url, {'q': 'la', 'limit': 'many'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RelatedProductTests(APITestCase):
+    def setUp(self):
+        from orders.models import Order, OrderItem
+        self.user = User.objects.create_user(username='buyer', password='testpassword', is_customer=True)
+        self.customer = Customer.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.tent, self.stove, self.mat, self.torch = [
+            Product.objects.create(name=name, description=name, price=10.0)
+            for name in ('Tent', 'Stove', 'Mat', 'Torch')
+        ]
+        baskets = [
+            [self.tent, self.stove, self.mat],
+            [self.tent, self.stove],
+            [self.tent, self.stove, self.torch],
+            [self.tent, self.mat],
+            [self.tent, self.torch],
+        ]
+        for index, basket in enumerate(baskets):
+            order = Order.objects.create(
+                customer_id=self.customer, total=10.0, original_total=10.0,
+                status='cancelled' if index == 4 else 'paid'
+            )
+            for product in basket:
+                OrderItem.objects.create(order_id=order, product_id=product, quantity=1, price=10.0)
+
+    def test_build_and_serve_related(self):
+        """Test co-purchases are ranked by shared orders, whatever the batch size"""
+        for batch_size in ('2', '5000'):
+            call_command('build_related_products', '--batch-size', batch_size, stdout=io.StringIO())
+            url = reverse('product-related', args=[self.tent.id])
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual([item['name'] for item in response.data['items']], ['Stove', 'Mat'])
+
+        # Cancelled orders do not count and single co-purchases are dropped
+        response = self.client.get(reverse('product-related', args=[self.torch.id]))
+        self.assertEqual(response.data['items'], [])
+
+    def test_inactive_products_are_skipped(self):
+        """Test deactivated products disappear from the rail"""
+        call_command('build_related_products', '--min-count', '1', stdout=io.StringIO())
+        Product.objects.filter(id=self.stove.id).update(is_active=False)
+        response = self.client.get(reverse('product-related', args=[self.tent.id]))
+        self.assertEqual([item['name'] for item in response.data['items']], ['Mat', 'Torch'])
+
+    def test_partner_counters_are_bounded(self):
+        """Test each product tracks at most --candidates partners and keeps the frequent one exact"""
+        from products.management.commands.build_related_products import Command
+        counter = {}
+        for partner in [1, 2, 1, 3, 1, 4, 1, 5, 1]:
+            Command.count_partners(counter, {partner}, capacity=2)
+        self.assertEqual(len(counter), 2)
+        self.assertEqual(counter[1], [5, 0])
+
+    def test_related_of_missing_product(self):
+        """Test an unknown product is a 404"""
+        response = self.client.get(reverse('product-related', args=[self.torch.id + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RendererTests(SimpleTestCase):
+    def test_output_matches_drf_json_renderer(self):
+        """Test ORJSONRenderer writes the same bytes as DRF's JSONRenderer"""
+        from datetime import date, datetime, timedelta, timezone as dt_timezone
+        from decimal import Decimal
+        from uuid import UUID
+        from zoneinfo import ZoneInfo
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from utils.renderers import ORJSONRenderer
+
+        payload = {
+            'price': Decimal('12.50'),
+            'total': Decimal('1999.99'),
+            'rating': 4.25,
+            'count': 3,
+            'utc': datetime(2026, 10, 17, 8, 30, 15, 120000, tzinfo=dt_timezone.utc),
+            'local': datetime(2026, 10, 17, 8, 30, tzinfo=ZoneInfo('Europe/Paris')),
+            'naive': datetime(2026, 10, 17, 8, 30),
+            'day': date(2026, 10, 17),
+            'elapsed': timedelta(minutes=90),
+            'uuid': UUID('12345678-1234-5678-1234-567812345678'),
+            'label': gettext_lazy('Products'),
+            'text': 'Caf\u00e9 \u2028 \u00fcber',
+            'nested': [{'id': 1, 'tags': ('a', 'b'), 'missing': None}],
+            5: True,
+        }
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+        for value in (float('nan'), float('inf'), Decimal('NaN')):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'value': value, 'other': None})
+            with self.assertRaises(ValueError):
+                ORJSONRenderer().render({'value': value, 'other': None})
+
+
+class ProductCardTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('product-list-create')
+        self.category = Category.objects.create(name='Kitchen', description='Kitchenware')
+        self.pan = Product.objects.create(name='Pan', description='Frying pan', price=35.0)
+        self.pan.categories.add(self.category)
+
+    def item(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.json()['items'][0]
+
+    def test_cards_match_the_serializer(self):
+        """Test a page built from cards renders like the serializer output"""
+        from products.serializers import ProductListSerializer
+        expected = json.loads(json.dumps(ProductListSerializer(Product.objects.get(id=self.pan.id)).data))
+        self.assertEqual(self.item(), expected)
+        # The second page is assembled from the cached card
+        self.assertEqual(self.client.get(self.url, {'sort': 'name_asc'}).json()['items'][0], expected)
+
+    def test_cards_follow_reviews_and_categories(self):
+        """Test reviews, renames and membership changes regenerate the card"""
+        self.item()
+        Review.objects.create(rating=4, comment='Even heat', product_id=self.pan)
+        self.assertEqual(self.item()['review_summary']['count'], 1)
+
+        self.category.name = 'Cookware'
+        self.category.save()
+        self.assertEqual(self.item()['categories'], [{'id': self.category.id, 'name': 'Cookware'}])
+
+        self.category.delete()
+        self.assertEqual(self.item()['categories'], [])
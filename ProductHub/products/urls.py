@@ -2,8 +2,14 @@
 from django.urls import path
 from .views import (
     ProductListCreateView,
+    ProductAdminListView,
+    ProductListCacheStatsView,
+    ProductImportView,
+    ProductBulkUpdateView,
+    ProductSuggestView,
     ProductDetailView,
     ProductReviewView,
+    ProductRelatedView,
     CategoryListCreateView,
     CategoryDetailView
 )
@@ -11,8 +17,14 @@ from .views import (
 urlpatterns = [
     # Product URLs
     path('', ProductListCreateView.as_view(), name='product-list-create'),
+    path('admin/', ProductAdminListView.as_view(), name='product-admin-list'),
+    path('bulk/', ProductBulkUpdateView.as_view(), name='product-bulk-update'),
+    path('import/', ProductImportView.as_view(), name='product-import'),
+    path('suggest/', ProductSuggestView.as_view(), name='product-suggest'),
+    path('cache/stats/', ProductListCacheStatsView.as_view(), name='product-list-cache-stats'),
     path('<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
     path('<int:pk>/reviews/', ProductReviewView.as_view(), name='product-review'),
+    path('<int:pk>/related/', ProductRelatedView.as_view(), name='product-related'),
     
     # Category URLs
     path('categories/', CategoryListCreateView.as_view(), name='category-list-create'),
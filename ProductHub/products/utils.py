@@ -5,6 +5,8 @@ from django.db import DatabaseError
 from rest_framework.response import Response
 from rest_framework import status
 from decimal import Decimal, InvalidOperation
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
 from .exceptions import (
     ProductException,
@@ -16,6 +18,7 @@ from .exceptions import (
 )
 
 from .models import Product, Category
+from .images import verify_image_format
 
 def handle_product_exceptions(func):
     """
@@ -104,7 +107,10 @@ def validate_product_image(image):
     
     if image.size > max_size:
         raise InvalidImageFormat('Image size must be less than 5MB')
-    
+
+    # The extension is only a hint; check what the file actually contains
+    verify_image_format(image)
+
     return True
 
 def validate_product_price(price):
@@ -137,3 +143,28 @@ def validate_product_review(rating, comment):
         raise ProductException('Review comment must be less than 200 characters')
     
     return rating, comment
+
+
+def build_etag(prefix, *timestamps):
+    """Strong ETag from the modification times a representation depends on"""
+    parts = '-'.join(f'{value.timestamp():.6f}' if value else '0' for value in timestamps)
+    return f'"{prefix}-{parts}"'
+
+
+def conditional_response(request, etag, last_modified):
+    """
+    Return a 304 (or 412) response when the request's validators still match,
+    otherwise None. Call before doing any serialization work.
+    """
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -1,17 +1,31 @@
+import hashlib
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Avg
-from .models import Product, Category, Review
-from .serializers import ProductSerializer, CategorySerializer, ReviewSerializer
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Prefetch
+from .models import Product, Category, RelatedProduct, Review
+from .serializers import ProductSerializer, ProductListSerializer, CategorySerializer, ReviewSerializer
+from .search import get_search_backend
+from .cards import get_product_cards
+from .suggest import suggest
+from .images import schedule_product_variants
+from .importers import FORMATS, ProductImporter, detect_format
+from .bulk import MAX_BULK_ENTRIES, apply_bulk_updates
+from .facets import compute_facets, parse_facets, parse_price_interval
+from .caching import (
+    category_list_cache_key, get_category_list_cache_timeout, get_list_cache_stats,
+    get_list_cache_timeout, product_list_cache_key, record_list_cache_lookup
+)
 from utils.pagination import CustomPagination
 from users.permissions import IsAdmin, IsCustomer
 from rest_framework.permissions import IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .utils import validate_product_image, validate_product_price, validate_category, validate_product, validate_product_review
+from .utils import validate_product_image, validate_product_price, validate_category, validate_product, validate_product_review, build_etag, conditional_response, set_validators
 
 class ProductListCreateView(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -22,6 +36,10 @@ class ProductListCreateView(APIView):
             self.permission_classes = [IsAdmin]
         return super().get_permissions()
 
+    def get_queryset(self):
+        # Inactive products are never listed, searched, counted or faceted
+        return Product.objects.active()
+
     @swagger_auto_schema(
         operation_description="Get all products",
         tags=["Products"],
@@ -30,20 +48,28 @@ class ProductListCreateView(APIView):
             openapi.Parameter('category', openapi.IN_QUERY, description="Category ID", type=openapi.TYPE_INTEGER),
             openapi.Parameter('min_price', openapi.IN_QUERY, description="Minimum price", type=openapi.TYPE_NUMBER, format='float'),
             openapi.Parameter('max_price', openapi.IN_QUERY, description="Maximum price", type=openapi.TYPE_NUMBER, format='float'),
-            openapi.Parameter('sort', openapi.IN_QUERY, description="Sort order", type=openapi.TYPE_STRING)
+            openapi.Parameter('facets', openapi.IN_QUERY, description="Comma-separated facets to compute: categories, price", type=openapi.TYPE_STRING),
+            openapi.Parameter('price_interval', openapi.IN_QUERY, description="Price facet bucket width (default 50)", type=openapi.TYPE_NUMBER, format='float'),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma-separated fields to return, e.g. id,name,price", type=openapi.TYPE_STRING),
+            openapi.Parameter('sort', openapi.IN_QUERY, description="Sort order: price_asc, price_desc, name_asc, name_desc, rating or relevance (with search)", type=openapi.TYPE_STRING)
         ]
     )
     def get(self, request):
         """Get all products with filtering, sorting, and search"""
-        queryset = Product.objects.all()
+        cache_key = product_list_cache_key(request)
+        cached_data = cache.get(cache_key)
+        record_list_cache_lookup(hit=cached_data is not None)
+        if cached_data is not None:
+            response = Response(cached_data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        queryset = self.get_queryset()
 
         # Search
         search_query = request.query_params.get('search')
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
+            queryset = get_search_backend().search(queryset, search_query)
 
         # Category Filter
         category_id = request.query_params.get('category')
@@ -61,10 +87,17 @@ class ProductListCreateView(APIView):
         # Rating Filter
         min_rating = request.query_params.get('min_rating')
         if min_rating:
-            queryset = queryset.annotate(avg_rating=Avg('reviews__rating'))\
-                              .filter(avg_rating__gte=min_rating)
+            queryset = queryset.filter(avg_rating__gte=min_rating)
+
+        # Facets are computed over the filtered, unsorted queryset
+        facets = None
+        facet_names = parse_facets(request.query_params.get('facets'))
+        if facet_names:
+            price_interval = parse_price_interval(request.query_params.get('price_interval'))
+            facets = compute_facets(queryset, facet_names, price_interval)
 
         # Sorting
+        sort_field = None
         sort_by = request.query_params.get('sort')
         if sort_by:
             sort_mapping = {
@@ -74,15 +107,39 @@ class ProductListCreateView(APIView):
                 'name_desc': '-name',
                 'rating': '-avg_rating'
             }
+            if search_query:
+                sort_mapping['relevance'] = '-relevance'
             sort_field = sort_mapping.get(sort_by)
             if sort_field:
                 queryset = queryset.order_by(sort_field)
 
+        # Full items come from the pre-rendered product cards, so the page
+        # query only needs IDs. Sparse fieldsets trim both the SELECT and the
+        # serialization instead.
+        fields = ProductListSerializer.parse_fields(request.query_params.get('fields'))
+        columns = ['id'] if fields is None else ProductListSerializer.columns_for(fields)
+        if sort_field and sort_field != '-relevance':
+            # cursor pagination reads the sort value from each row
+            columns.append(sort_field.lstrip('-'))
+        queryset = queryset.only(*columns)
+        if fields is not None and 'categories' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('categories', queryset=Category.objects.only('id', 'name'))
+            )
+
         # Apply pagination
         paginator = self.pagination_class()
         paginated_queryset = paginator.paginate_queryset(queryset, request)
-        serializer = ProductSerializer(paginated_queryset, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        if fields is None:
+            items = get_product_cards([product.id for product in paginated_queryset])
+        else:
+            items = ProductListSerializer(paginated_queryset, many=True, fields=fields).data
+        response = paginator.get_paginated_response(items)
+        if facets is not None:
+            response.data['facets'] = facets
+        cache.set(cache_key, response.data, timeout=get_list_cache_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
 
     @swagger_auto_schema(
         operation_description="Create a new product",
@@ -108,6 +165,8 @@ class ProductListCreateView(APIView):
 
         serializer.is_valid(raise_exception=True)
         product = serializer.save()
+        if product.image:
+            schedule_product_variants(product.id)
 
 
         category_ids = request.data.get('category_ids', [])
@@ -119,13 +178,146 @@ class ProductListCreateView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
         
 
+class ProductAdminListView(ProductListCreateView):
+    """The product list including inactive products, for admins"""
+    permission_classes = [IsAuthenticated, IsAdmin]
+    http_method_names = ['get', 'head', 'options']
+
+    def get_queryset(self):
+        queryset = Product.objects.all()
+        is_active = self.request.query_params.get('is_active')
+        if is_active in ('true', 'false'):
+            queryset = queryset.filter(is_active=is_active == 'true')
+        return queryset
+
+
+class ProductImportView(APIView):
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Bulk import products from a CSV or JSON Lines file",
+        tags=["Products"],
+        manual_parameters=[
+            openapi.Parameter('file', openapi.IN_FORM, description="CSV or JSON Lines file", type=openapi.TYPE_FILE, required=True),
+            openapi.Parameter('format', openapi.IN_FORM, description="csv or jsonl, detected from the file name by default", type=openapi.TYPE_STRING, required=False)
+        ]
+    )
+    def post(self, request):
+        """Bulk import products from a CSV or JSON Lines file"""
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'An import file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('format') or detect_format(upload.name)
+        if file_format not in FORMATS:
+            return Response(
+                {'error': f"Unsupported import format. Choices are: {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        report = ProductImporter().run(upload.file, file_format)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
+class ProductBulkUpdateView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Update price, stock or availability of many products at once",
+        tags=["Products"],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'updates': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'id': openapi.Schema(type=openapi.TYPE_INTEGER, description='Product ID'),
+                            'price': openapi.Schema(type=openapi.TYPE_NUMBER, description='Price'),
+                            'stock': openapi.Schema(type=openapi.TYPE_INTEGER, description='Stock'),
+                            'is_active': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='Is active')
+                        }
+                    )
+                )
+            }
+        )
+    )
+    def patch(self, request):
+        """Update price, stock or availability of many products at once"""
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Request body must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+        updates = request.data.get('updates')
+        if not isinstance(updates, list) or not updates:
+            return Response({'error': 'updates must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(updates) > MAX_BULK_ENTRIES:
+            return Response(
+                {'error': f'At most {MAX_BULK_ENTRIES} updates are allowed per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = apply_bulk_updates(updates)
+        summary = {outcome: 0 for outcome in ('updated', 'not_found', 'invalid')}
+        for result in results:
+            summary[result['status']] += 1
+        return Response({**summary, 'results': results})
+
+
+class ProductListCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Get product list cache hit/miss counters",
+        tags=["Products"]
+    )
+    def get(self, request):
+        """Get product list cache hit/miss counters"""
+        return Response(get_list_cache_stats())
+
+
+class ProductSuggestView(APIView):
+    # Anonymous and answered from the in-process index: no query at all,
+    # not even the JWT user lookup
+    authentication_classes = []
+    permission_classes = []
+    default_limit = 8
+    max_limit = 25
+
+    @swagger_auto_schema(
+        operation_description="Autocomplete product and category names by prefix",
+        tags=["Products"],
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Prefix typed so far", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Suggestions of each kind (default 8, max 25)", type=openapi.TYPE_INTEGER)
+        ]
+    )
+    def get(self, request):
+        """Autocomplete product and category names by prefix"""
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.max_limit))
+
+        found = suggest(query, limit)
+        return Response({
+            'query': query,
+            'products': found['product'],
+            'categories': found['category']
+        })
+
+
 class ProductDetailView(APIView):
     parser_classes = (MultiPartParser, FormParser)
+    # Also used by the views that feed the product page, e.g. ProductRelatedView
+    read_permission_classes = [IsAuthenticated, IsCustomer | IsAdmin]
+
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
             self.permission_classes = [IsAuthenticated, IsAdmin]
         else:
-            self.permission_classes = [IsAuthenticated, IsCustomer | IsAdmin]
+            self.permission_classes = self.read_permission_classes
         return super().get_permissions()
 
     def get_object(self, pk):
@@ -137,9 +329,20 @@ class ProductDetailView(APIView):
     )
     def get(self, request, pk):
         """Get a specific product with its reviews and categories"""
-        product = self.get_object(pk)
+        # The representation embeds the product's categories, so their
+        # modification times are part of the validators
+        product = get_object_or_404(
+            Product.objects.annotate(categories_updated_at=Max('categories__updated_at')),
+            pk=pk
+        )
+        last_modified = max(filter(None, [product.updated_at, product.categories_updated_at]))
+        etag = build_etag(f'product-{product.id}', product.updated_at, product.categories_updated_at)
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
         serializer = ProductSerializer(product)
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag, last_modified)
 
     @swagger_auto_schema(
         operation_description="Update a product",
@@ -156,10 +359,17 @@ class ProductDetailView(APIView):
     def put(self, request, pk):
         """Update a product"""
         product = self.get_object(pk)
+        image = request.FILES.get('image')
+        validate_product_image(image)
         serializer = ProductSerializer(product, data=request.data, partial=True)
         
         if serializer.is_valid():
-            updated_product = serializer.save()
+            if image:
+                # The old variants show the previous image until new ones are built
+                updated_product = serializer.save(image_variants={})
+                schedule_product_variants(updated_product.id)
+            else:
+                updated_product = serializer.save()
             
             # Handle categories update if provided
             category_ids = request.data.get('category_ids')
@@ -191,20 +401,40 @@ class ProductReviewView(APIView):
     pagination_class = CustomPagination
     permission_classes = [IsAuthenticated, IsCustomer | IsAdmin]
 
+    # Keyset orderings, each served by one of the Review indexes
+    sort_mapping = {
+        'newest': ['-posted_at', '-id'],
+        'oldest': ['posted_at', 'id'],
+        'rating_desc': ['-rating', '-posted_at', '-id'],
+        'rating_asc': ['rating', 'posted_at', 'id']
+    }
+
     @swagger_auto_schema(
-        operation_description="Get all reviews for a specific product",
-        tags=["Reviews"]
+        operation_description="Get the reviews of a specific product, cursor-paginated, with its rating summary",
+        tags=["Reviews"],
+        manual_parameters=[
+            openapi.Parameter('sort', openapi.IN_QUERY, description="Sort order: newest (default), oldest, rating_desc or rating_asc", type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous or next link", type=openapi.TYPE_STRING)
+        ]
     )
     def get(self, request, pk):
         """Get all reviews for a specific product"""
-        product = get_object_or_404(Product, pk=pk)
-        reviews = Review.objects.filter(product_id=product)
-        
-        # Apply pagination
+        # The summary comes from the product's precomputed rating columns
+        product = get_object_or_404(
+            Product.objects.only('id', *ProductListSerializer.field_columns['review_summary']),
+            pk=pk
+        )
+        ordering = self.sort_mapping.get(request.query_params.get('sort'), self.sort_mapping['newest'])
+        reviews = Review.objects.filter(product_id=product).order_by(*ordering)
+
+        # Apply pagination: keyset pages cost the same however deep they are
         paginator = self.pagination_class()
+        paginator.use_cursor = True
         paginated_reviews = paginator.paginate_queryset(reviews, request)
         serializer = ReviewSerializer(paginated_reviews, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['review_summary'] = product.review_summary
+        return response
 
     @swagger_auto_schema(
         operation_description="Add a review to a product",
@@ -217,6 +447,7 @@ class ProductReviewView(APIView):
             }
         )
     )
+    @transaction.atomic
     def post(self, request, pk):
         """Add a review to a product"""
         product = validate_product(pk)
@@ -233,6 +464,31 @@ class ProductReviewView(APIView):
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
         
+class ProductRelatedView(APIView):
+    # Whoever may open a product page may load its rail
+    permission_classes = ProductDetailView.read_permission_classes
+    fields = ['id', 'name', 'price', 'image', 'image_variants', 'average_rating']
+
+    @swagger_auto_schema(
+        operation_description="Get the products most often bought together with a product",
+        tags=["Products"]
+    )
+    def get(self, request, pk):
+        """Get the products most often bought together with a product"""
+        # Precomputed by build_related_products: one lookup on (product_id, rank)
+        links = (
+            RelatedProduct.objects
+            .filter(product_id=pk, related_id__is_active=True)
+            .select_related('related_id')
+            .order_by('rank')
+        )
+        related = [link.related_id for link in links]
+        if not related:
+            get_object_or_404(Product, pk=pk)
+        serializer = ProductListSerializer(related, many=True, fields=self.fields)
+        return Response({'items': serializer.data})
+
+
 class CategoryListCreateView(APIView):
     pagination_class = CustomPagination
 
@@ -248,13 +504,41 @@ class CategoryListCreateView(APIView):
     )
     def get(self, request):
         """Get all categories"""
-        categories = Category.objects.all()
-        
-        # Apply pagination
-        paginator = self.pagination_class()
-        paginated_categories = paginator.paginate_queryset(categories, request)
-        serializer = CategorySerializer(paginated_categories, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        # Served from the cache until a category or its membership changes;
+        # a hit, including a 304, costs no query
+        cache_key = category_list_cache_key(request)
+        cached = cache.get(cache_key)
+        if cached is None:
+            validators = Category.objects.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+            last_modified = validators['last_modified']
+            query_digest = hashlib.sha1(request.GET.urlencode().encode('utf-8')).hexdigest()[:12]
+            etag = build_etag(f"categories-{validators['count']}-{query_digest}", last_modified)
+            not_modified = conditional_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+
+            categories = Category.objects.order_by('id')
+
+            # Apply pagination
+            paginator = self.pagination_class()
+            paginated_categories = paginator.paginate_queryset(categories, request)
+            serializer = CategorySerializer(paginated_categories, many=True)
+            response = paginator.get_paginated_response(serializer.data)
+            cache.set(
+                cache_key,
+                {'data': response.data, 'etag': etag, 'last_modified': last_modified},
+                get_category_list_cache_timeout()
+            )
+            response['X-Cache'] = 'MISS'
+            return set_validators(response, etag, last_modified)
+
+        etag, last_modified = cached['etag'], cached['last_modified']
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        response = Response(cached['data'])
+        response['X-Cache'] = 'HIT'
+        return set_validators(response, etag, last_modified)
 
     @swagger_auto_schema(
         operation_description="Create a new category",
@@ -293,8 +577,13 @@ class CategoryDetailView(APIView):
     def get(self, request, pk):
         """Get a specific category"""
         category = self.get_object(pk)
+        etag = build_etag(f'category-{category.id}', category.updated_at)
+        not_modified = conditional_response(request, etag, category.updated_at)
+        if not_modified is not None:
+            return not_modified
+
         serializer = CategorySerializer(category)
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag, category.updated_at)
 
     @swagger_auto_schema(
         operation_description="Update a category",
@@ -1,13 +1,51 @@
 # utils/pagination.py
+import datetime
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
 
 class CustomPagination(PageNumberPagination):
     page_size = 2
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+    # Keyset pagination: enabled with ?pagination=cursor, by passing a cursor,
+    # or for every request when a view sets use_cursor = True
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    use_cursor = False
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor_mode = (
+            self.use_cursor
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_cursor(queryset, request)
+
     def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return Response({
+                'links': {
+                    'next': self.get_cursor_link(self.next_position),
+                    'previous': self.get_cursor_link(self.previous_position)
+                },
+                'items': data
+            })
         return Response({
             'links': {
                 'next': self.get_next_link(),
@@ -18,3 +56,124 @@ class CustomPagination(PageNumberPagination):
             'current_page': self.page.number,
             'items': data
         })
+
+    def paginate_cursor(self, queryset, request):
+        """
+        Return one page after (or, for a reversed cursor, before) the position
+        encoded in the cursor. No COUNT is issued and no rows are skipped with
+        OFFSET, so every page costs the same as the first one.
+        """
+        page_size = self.get_page_size(request)
+        ordering = self.get_cursor_ordering(queryset)
+        values, reverse = self.decode_cursor(request, ordering, queryset)
+
+        if reverse:
+            ordering = [self._flip(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(ordering, values))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            ordering = [self._flip(field) for field in ordering]
+
+        self.next_position = None
+        self.previous_position = None
+        if results:
+            if has_more or reverse:
+                self.next_position = (self._position(results[-1], ordering), False)
+            if (has_more and reverse) or (values is not None and not reverse):
+                self.previous_position = (self._position(results[0], ordering), True)
+        return results
+
+    def get_cursor_ordering(self, queryset):
+        """Ordering of the queryset with a final id tie-breaker"""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or ['id'])
+        for field in ordering:
+            if not isinstance(field, str) or '__' in field or field.lstrip('-') == '?':
+                raise ValueError(f'Cursor pagination cannot order by {field!r}')
+        ordering = ['id' if field == 'pk' else '-id' if field == '-pk' else field for field in ordering]
+        if not any(field.lstrip('-') == 'id' for field in ordering):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return ordering
+
+    def decode_cursor(self, request, ordering, queryset):
+        """Position values coerced to the types of the ordering fields, and the direction"""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            position = json.loads(b64decode(token.encode('ascii'), validate=True))
+            if not isinstance(position, dict) or set(position) - {'v', 'r'}:
+                raise ValueError('Unexpected cursor keys')
+            values, reverse = position['v'], position.get('r', 0)
+            if not isinstance(values, list) or len(values) != len(ordering) or reverse not in (0, 1):
+                raise ValueError('Unexpected cursor shape')
+            values = [
+                self._coerce_value(queryset, field.lstrip('-'), value)
+                for field, value in zip(ordering, values)
+            ]
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, BinasciiError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(reverse)
+
+    @staticmethod
+    def _coerce_value(queryset, name, value):
+        """A cursor value as the Python type of the model field or annotation it orders"""
+        if value is None or isinstance(value, (bool, list, dict)):
+            raise ValueError(f'Invalid cursor value for {name}')
+        if name in queryset.query.annotations:
+            field = queryset.query.annotations[name].output_field
+        else:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                raise ValueError(f'Unknown cursor field {name}')
+        value = field.to_python(value)
+        if value is None:
+            raise ValueError(f'Invalid cursor value for {name}')
+        return value
+
+    def encode_cursor(self, values, reverse):
+        position = {'v': values}
+        if reverse:
+            position['r'] = 1
+        payload = json.dumps(position, default=self._encode_value, separators=(',', ':'))
+        return b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def get_cursor_link(self, position):
+        if position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*position))
+
+    @staticmethod
+    def _encode_value(value):
+        # Full precision: a truncated timestamp would break keyset equality
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _position(obj, ordering):
+        return [getattr(obj, field.lstrip('-')) for field in ordering]
+
+    @staticmethod
+    def _keyset_filter(ordering, values):
+        """Rows strictly after values in ordering: (a > x) OR (a = x AND b > y) ..."""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {prior.lstrip('-'): value for prior, value in zip(ordering[:index], values)}
+            condition |= Q(**equal, **{f'{name}__{lookup}': values[index]})
+        return condition
@@ -0,0 +1,99 @@
+# utils/renderers.py
+import math
+from collections.abc import Mapping
+from datetime import timedelta
+from decimal import Decimal
+
+import orjson
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+
+class PreRendered(Mapping):
+    """
+    A JSON object that is already encoded. ORJSONRenderer copies ``raw`` into
+    the output as is; Python callers (tests, the browsable API) can still read
+    it as a mapping, decoded on first access.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._decoded = None
+
+    def _data(self):
+        if self._decoded is None:
+            self._decoded = orjson.loads(self.raw)
+        return self._decoded
+
+    def __getitem__(self, key):
+        return self._data()[key]
+
+    def __iter__(self):
+        return iter(self._data())
+
+    def __len__(self):
+        return len(self._data())
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.raw!r})'
+
+    def __reduce__(self):
+        return type(self), (self.raw,)
+
+
+def encode_default(value):
+    """Types orjson does not encode natively, encoded like DRF's JSONEncoder"""
+    if isinstance(value, PreRendered):
+        return orjson.Fragment(value.raw)
+    if isinstance(value, Decimal):
+        # Serializer fields already turn decimals into strings; raw ones,
+        # e.g. from values() querysets, become numbers as with DRF
+        return float(value)
+    if isinstance(value, timedelta):
+        return str(value.total_seconds())
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, Promise):
+        return str(value)
+    if isinstance(value, Mapping):
+        return dict(value)
+    if hasattr(value, '__iter__'):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _check_finite(data):
+    """Raise like DRF's strict encoder on NaN or infinity, which orjson writes as null"""
+    if isinstance(data, (float, Decimal)):
+        if not math.isfinite(data):
+            raise ValueError('Out of range float values are not JSON compliant')
+    elif isinstance(data, dict):
+        for item in data.values():
+            _check_finite(item)
+    elif isinstance(data, (list, tuple)):
+        for item in data:
+            _check_finite(item)
+
+
+def dumps(data, option=0):
+    output = orjson.dumps(data, default=encode_default, option=option | orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+    # Only output with a null can hide one; PreRendered blobs were checked when encoded
+    if api_settings.STRICT_JSON and b'null' in output:
+        _check_finite(data)
+    # Valid JSON but not valid JavaScript; escaped by DRF as well
+    return output.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ORJSONRenderer(BaseRenderer):
+    """JSON renderer backed by orjson, which also passes PreRendered blobs through"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # The browsable API asks for indented output
+        indent = accepted_media_type and 'indent=' in accepted_media_type
+        return dumps(data, orjson.OPT_INDENT_2 if indent else 0)